@@ -5,7 +5,7 @@ Created on Mon Jun 16 21:45:33 2025
 @author: david
 """
 
-import pandas as pd
+from __future__ import annotations
 from loguru import logger
 import platform
 import sys
@@ -15,11 +15,22 @@ import math
 from datetime import datetime, date
 import rosutils as ru
 import rosdate as rd
+import rosdb as rdb
+import rosprof as rp
+import rosrender as rrd
+import rosindex as rix
+import rosxl as rx
 import json
 
+# pandas, numpy and the modules built on them (rossheet, rossummary), the
+# query service, the SQLite store and the process pool are imported where
+# they are used, so a single-driver run never pays for them
+
 daysoff = ['OFF', 'ADO', 'xxxOFF', 'uwsOFF', 'xxxADO', 'uwsADO', 'xxxOFF9', 'xxxOFF8', 'oAsg', 'A/L', 'PFL', 'LSL', 'OFFL', 'WOPL', 'WOP' ]
 db_files = ['10_mon_thu-db.txt', '11_fri-db.txt', '12_sat-db.txt', '13_sun-db.txt', '14_mon_fri_vac-db.txt' ]
 DEFAULT_DRIVER = "MONAGHAN"
+PROFILE_OUTPUT = 'roster_metrics.json'
+ROSTER_DAYS = 28
 
 __version__ = '0.2'
 
@@ -68,165 +79,287 @@ def clean_roster_list(input_list: list) -> list:
 
     return cleaned_list
 
-def get_row_as_list(df: pd.DataFrame, row_index: int) -> list:
+
+def match_shift(db_file, shift, duty_db):
+    if (check_for_day_off(shift)):
+        return shift
+    return duty_db.find(db_file, str(shift))
+
+def resolve_shifts(calendar, shifts, duty_db, resolved=None, days_off=None):
     """
-    Extracts a specific row from a Pandas DataFrame and returns it as a list.
+    Matches each rostered shift of a driver against the duty databases.
 
     Args:
-        df: The input Pandas DataFrame.
-        row_index: The integer index of the row to extract.
+        calendar: The RosterCalendar for the roster period.
+        shifts: The driver's cleaned roster cells, one per day.
+        duty_db: The loaded DutyDatabase.
+        resolved: Optional dict shared between drivers so that each
+                  (db file, shift) pair is only looked up once.
+        days_off: Optional day-off flag per shift, as classified by
+                  RosterSheet, so day-off cells skip the lookup.
 
     Returns:
-        A list representing the data in the specified row.
-        Returns an empty list if the row_index is out of bounds or df is not a DataFrame.
+        A list with the matched duty line or day-off code for each day, ''
+        for a blank cell.
     """
-    if not isinstance(df, pd.DataFrame):
-        print("Error: The first argument must be a Pandas DataFrame.")
-        return []
+    if resolved is None:
+        resolved = {}
+
+    prof = rp.profiler
+    duty = []
+    for i, (db_file, shift) in enumerate(zip(calendar.day_db_files, shifts)):
+        if days_off is not None and days_off[i]:
+            prof.count('days_off')
+            duty.append(shift)
+            continue
+        if shift == '':
+            # a blank roster cell: nothing to look up
+            duty.append('')
+            continue
+
+        key = (db_file, shift)
+        res = resolved.get(key)
+        if res is None:
+            with prof.stage('match_shift'):
+                res = match_shift(db_file, shift, duty_db)
+            resolved[key] = res
+        else:
+            prof.count('lookup_memo_hits')
+        duty.append(res)
 
-    if row_index < 0 or row_index >= len(df):
-        print(f"Error: Row index {row_index} is out of bounds for DataFrame with {len(df)} rows.")
-        return []
+    return duty
 
-    try:
-        # Select the row by its integer index and convert it to a list
-        row_list = df.iloc[row_index].tolist()
-        return row_list
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return []
+def iter_driver_rosters(sheet, calendar, duty_db):
+    """
+    Resolves every driver row in a cleaned roster sheet, one driver at a time.
 
+    Lookups are shared between drivers, so the work grows with the number
+    of distinct duties in the roster rather than drivers x days.
 
-def find_row_index_by_search_term(df: pd.DataFrame, search_term: str) -> list[int]:
+    Yields:
+        (driver_name, duty) tuples in sheet order.
+    """
+    resolved = {}
+    for driver_name, row in sheet.drivers.items():
+        shifts = sheet.row(row)[sheet.n:]
+        days_off = sheet.row_is_off(row)[sheet.n:]
+        yield driver_name, resolve_shifts(calendar, shifts, duty_db, resolved, days_off)
+            
+def roster_date_config(jdata, file):
+    """
+    Returns the "date" config for a roster file: the "date" section of
+    config.json, overridden by the file's entry in the "rosters" section
+    (keyed by file name) if it has one, so each workbook of an archive
+    can carry its own roster_start and vacations.
     """
-    Finds the index/indices of rows in a Pandas DataFrame that contain a specific search term.
-    This function searches across all columns of the DataFrame.
+    date_cfg = dict(jdata['date'])
+    date_cfg.update(jdata.get('rosters', {}).get(os.path.basename(file), {}))
+    return date_cfg
 
-    Args:
-        df: The input Pandas DataFrame.
-        search_term: The string term to search for within the DataFrame.
+def open_roster(file, date_cfg, n):
+    """
+    Reads and cleans a roster workbook and builds its calendar.
+
+    The cleaned sheet is saved as a snapshot keyed by the workbook's hash,
+    which later runs memory-map instead of parsing the workbook again.
 
     Returns:
-        A list of integer indices where the search term was found.
-        Returns an empty list if the search term is not found or if the input is invalid.
+        (calendar, sheet)
     """
-    if not isinstance(df, pd.DataFrame):
-        print("Error: The first argument must be a Pandas DataFrame.")
-        return []
-
-    if not isinstance(search_term, str):
-        print("Error: The search term must be a string.")
-        return []
-
-    found_indices = []
-    # Iterate through each row of the DataFrame
-    for index, row in df.iterrows():
-        # Check if the search_term exists in any of the row's values (converted to string)
-        if any(search_term in str(value) for value in row.values):
-            found_indices.append(index)
-    return found_indices
-
-def match_term_shift(day, shift):
-
-    if day == 'Saturday':
-        if (check_for_day_off(shift)):
-            res = shift
-        else:
-            res = ru.find_row_with_string(db_files[2], str(shift))
-    elif day == 'Sunday':
-        if (check_for_day_off(shift)):
-            res = shift
-        else:
-            res = ru.find_row_with_string(db_files[3], str(shift))
-    elif day == 'Friday':
-        if (check_for_day_off(shift)):
-            res = shift
-        else:
-            res = ru.find_row_with_string(db_files[1], str(shift))
-    else: #if everything else has been checked then it falls through to Mon-Thur
-        if (check_for_day_off(shift)):
-            res = shift
-        else:
-            res = ru.find_row_with_string(db_files[0], str(shift))
-  
-    return res            
-    
-          
-def match_vac_shift(day, shift):
-    
-    if day == 'Saturday':
-        if (check_for_day_off(shift)):
-            res = shift
-        else:
-            res = ru.find_row_with_string(db_files[2], str(shift))
-    elif day == 'Sunday':
-        if (check_for_day_off(shift)):
-            res = shift
-        else:
-            res = ru.find_row_with_string(db_files[3], str(shift))
-    else: #if everything else has been checked then it falls through to Mon-Fri
-        if (check_for_day_off(shift)):
-            res = shift
-        else:
-            res = ru.find_row_with_string(db_files[4], str(shift))
-  
-    return res            
-            
-def pad_str_whitespace(str, max):
-    white_space = ' '
-    str_len = len(str)
-    pad = max - str_len
-    return str + white_space * pad
+    import pandas as pd
+    import rossheet as rs
+
+    prof = rp.profiler
+    calendar = rd.RosterCalendar.from_config(date_cfg, db_files, ROSTER_DAYS)
+
+    # a workbook read before is loaded from its columnar snapshot
+    with prof.stage('load_snapshot'):
+        snapshot = rs.snapshot_path(file)
+        sheet = rs.load_snapshot(snapshot, daysoff, n, ROSTER_DAYS)
+    if sheet is not None:
+        prof.count('snapshot_hits')
+        return calendar, sheet
+
+    with prof.stage('read_excel'):
+        df = pd.read_excel(file)
+    with prof.stage('clean_sheet'):
+        sheet = rs.RosterSheet(df, daysoff, n, ROSTER_DAYS)
+    with prof.stage('save_snapshot'):
+        rs.save_snapshot(sheet, snapshot)
+    return calendar, sheet
+
+def iter_roster_file(sheet, calendar, duty_db, driver=None):
+    """
+    Resolves either every driver of a cleaned sheet or, if driver is given,
+    the first driver matching it.
 
-def pretty_print(driver, dates, days, times):
+    Yields:
+        (driver_name, duty) tuples; nothing if driver is not found.
+    """
+    if driver is None:
+        yield from iter_driver_rosters(sheet, calendar, duty_db)
+        return
+
+    with rp.profiler.stage('driver_search'):
+        get_index = sheet.find_rows(driver)
+    if not get_index:
+        return
+    clean_shifts = sheet.row(get_index[0])
+    days_off = sheet.row_is_off(get_index[0])[sheet.n:]
+    yield clean_shifts[0], resolve_shifts(calendar, clean_shifts[sheet.n:], duty_db, days_off=days_off)
+
+def find_driver_roster(file, date_cfg, n, duty_db, driver):
+    """
+    Resolves one driver without loading the whole workbook: the sheet is
+    streamed row by row and the driver picked as sheet.find_rows would,
+    an exact name first, then the first name containing driver.
 
-    #create print strings
-    print_strs = []
-    print_str_length = 0
-    for item in zip(dates,days, times):
-        print_str = f'| {item[0]} | {item[1]:<9} | {item[2]} '
-        print_strs.append(print_str)
+    Returns:
+        (calendar, rosters) with a single (driver_name, duty) roster, or
+        None if no driver name matched, so the caller can fall back to
+        searching every cell of the full sheet.
+    """
+    prof = rp.profiler
+    with prof.stage('read_driver_row'):
+        try:
+            cells = rx.find_driver_row(file, driver, daysoff, n, ROSTER_DAYS)
+        except Exception as e:
+            logger.warning(f'Could not stream {file}, reading the whole workbook: {e}')
+            return None
+    if cells is None:
+        return None
+
+    calendar = rd.RosterCalendar.from_config(date_cfg, db_files, ROSTER_DAYS)
+    days_off = [cell in daysoff for cell in cells[n:]]
+    return calendar, [(cells[0], resolve_shifts(calendar, cells[n:], duty_db, days_off=days_off))]
+
+# the read-only DutyDatabase handed to each worker process once, at start up
+_worker_duty_db = None
+
+def _init_worker(duty_db, profile=False):
+    global _worker_duty_db
+    _worker_duty_db = duty_db
+    if profile:
+        rp.profiler.enable()
+
+def process_roster_file(file, date_cfg, n, driver=None):
+    """
+    Loads and resolves one roster workbook in a worker process.
 
-        # determine the max length
-        if len(print_str) > print_str_length:
-            print_str_length = len(print_str)
+    Returns:
+        (calendar, rosters, profile) where rosters is a list of
+        (driver_name, duty) and profile is the worker's profiler summary
+        for this file, None when profiling is off.
+    """
+    prof = rp.profiler
+    # a worker handles several files, each reports only its own stages
+    prof.reset()
+    calendar, sheet = open_roster(file, date_cfg, n)
+    rosters = list(iter_roster_file(sheet, calendar, _worker_duty_db, driver))
+    return calendar, rosters, prof.summary() if prof.enabled else None
+
+def iter_roster_files(files, date_cfgs, n, duty_db, driver=None, jobs=None):
+    """
+    Resolves several roster workbooks, loading and parsing them in parallel
+    in a process pool that shares one copy of the duty databases per worker.
+    A single workbook is handled in-process and streamed driver by driver.
 
-    #set min pad width
-    if print_str_length < 63:
-        print_str_length = 63
- 
-    #pad each string with whitespace out to max string length
-    dash = '-' * (print_str_length +1)
+    Yields:
+        (file, calendar, rosters) in the order the files were given.
+    """
+    if len(files) == 1:
+        if driver is not None:
+            found = find_driver_roster(files[0], date_cfgs[0], n, duty_db, driver)
+            if found is not None:
+                yield (files[0],) + found
+                return
+        calendar, sheet = open_roster(files[0], date_cfgs[0], n)
+        yield files[0], calendar, iter_roster_file(sheet, calendar, duty_db, driver)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    prof = rp.profiler
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(duty_db, prof.enabled)) as pool:
+        futures = [pool.submit(process_roster_file, file, date_cfg, n, driver)
+                   for file, date_cfg in zip(files, date_cfgs)]
+        for file, future in zip(files, futures):
+            calendar, rosters, profile = future.result()
+            prof.merge(profile)
+            yield file, calendar, rosters
+
+def load_depot(file, config_file="config.json"):
+    """
+    Loads the config, duty databases and roster workbook and resolves every
+    driver.
 
-    print(dash)
-    print(pad_str_whitespace(f'| Driver:            {driver}', print_str_length) + '|')
-    print(pad_str_whitespace(f'| Roster start date: {dates[0]:}', print_str_length) + '|')
-    print(dash)
-    
-    print(pad_str_whitespace('|   Date     |   Day     |     Duty     Sign in/out    Run(s) ', print_str_length) + '|')
-    print(dash)
-    for strng in print_strs:
-        print(pad_str_whitespace(strng, print_str_length) + '|')
-    print(dash)
-   
+    Returns:
+        (calendar, sheet, rosters) where rosters maps driver name -> duty list.
+    """
+    with open(config_file, 'r') as cfg:
+        jdata = json.load(cfg)
+
+    duty_db = rdb.DutyDatabase(db_files)
+    calendar, sheet = open_roster(file, roster_date_config(jdata, file), jdata['clean']['route_clean_depth'])
+    rosters = dict(iter_driver_rosters(sheet, calendar, duty_db))
+    return calendar, sheet, rosters
+
+def pretty_print(driver, dates, days, times):
+    rrd.TextRenderer(sys.stdout).driver(driver, dates, days, times)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='parse schedule',
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     
-    parser.add_argument('f_roster', metavar='ROSTER', nargs='+', help='Name of roster file')
+    parser.add_argument('f_roster', metavar='ROSTER', nargs='+', help='Name of roster file(s)')
     parser.add_argument('-d', '--driver', default=DEFAULT_DRIVER, help=f'set driver. Default is {DEFAULT_DRIVER}.')
+    parser.add_argument('-a', '--all-drivers', action='store_true', help='process every driver in the roster')
+    parser.add_argument('-s', '--summary', action='store_true', help='print per-driver and depot totals for the roster period')
+    parser.add_argument('-c', '--compliance', action='store_true', help='check every driver against the compliance rules in config.json and print the violations')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes for several roster files. Default is one per CPU.')
+    parser.add_argument('--serve', action='store_true', help='keep the roster loaded and answer HTTP/JSON queries')
+    parser.add_argument('--host', default='127.0.0.1', help='address to serve on')
+    parser.add_argument('--port', type=int, default=8080, help='port to serve on')
+    parser.add_argument('--profile', nargs='?', const=PROFILE_OUTPUT, default=None, metavar='METRICS',
+                        help=f'log per-stage timings and counts and write them to METRICS (default {PROFILE_OUTPUT})')
+    parser.add_argument('--who', metavar='TERM', help='list the drivers on a duty, route or school run (e.g. H166, 190X, 761n)')
+    parser.add_argument('--cover', metavar='START-END', help='list the duties worked in a time window (e.g. 6:00-9:30) and the drivers OFF or ADO')
+    parser.add_argument('--within', action='store_true', help='with --cover, only duties that fit inside the window')
+    parser.add_argument('--on', metavar='DATE', default='today', help='date for --who and --cover: today, a day name or dd-mm-yyyy')
+    parser.add_argument('--diff', action='store_true', help='compare two rosters, given as workbooks or --incremental state files, and print the changed days')
+    parser.add_argument('--incremental', metavar='STATE', help='resolve only the cells changed since the run that wrote STATE and print them')
+    parser.add_argument('--sqlite', metavar='PATH', help="store the duties and every driver's resolved roster in the SQLite database PATH")
+    parser.add_argument('-f', '--format', choices=sorted(rrd.RENDERERS), default='text', help='output format for the rosters')
+    parser.add_argument('-o', '--output', default=None, metavar='FILE', help='write the output to FILE instead of stdout')
  
     args = parser.parse_args()
     
-    file = args.f_roster[0]
-
-    cfg = open("config.json", 'r')
-    jdata = json.load(cfg)
+    files = args.f_roster
+    if args.diff and len(files) != 2:
+        parser.error('--diff takes exactly two rosters, the old one and the new one')
+    if args.format != 'text' and (args.serve or args.diff or args.incremental or args.summary or args.compliance
+                                  or args.who or args.cover):
+        parser.error('-f/--format only applies to roster output, not to --serve, --diff, --incremental, '
+                     '--summary, --compliance, --who or --cover')
+    if args.output and args.serve:
+        parser.error('-o/--output cannot be used with --serve')
+    window = None
+    if args.cover:
+        import rosinterval as riv
+
+        try:
+            window = riv.parse_window(args.cover)
+        except ValueError as e:
+            parser.error(str(e))
+    prof = rp.profiler
+    if args.profile:
+        prof.enable()
+
+    with prof.stage('config'):
+        cfg = open("config.json", 'r')
+        jdata = json.load(cfg)
     
-    start_date = jdata['date']['roster_start']
-    vac_start = rd.format_date(jdata['date']['vac_start'])
-    vac_fin   = rd.format_date(jdata['date']['vac_finish'])
+        date_cfgs = [roster_date_config(jdata, file) for file in files]
 
     n = jdata['clean']['route_clean_depth']
 
@@ -235,36 +368,156 @@ if __name__ == '__main__':
     logger.info(f'Starting {os.path.basename(__file__)} Version: {__version__}...')
     logger.info(f'platform: {platform.system()}')
 
-    logger.info(f'filename:          {file}')
-    logger.info(f'Driver:            {args.driver}')
-    logger.info(f'Roster Start Date: {rd.format_date(start_date)}')
-    logger.info(f'Vac Start Date:    {vac_start}')
-    logger.info(f'Vac End   Date:    {vac_fin}')
-
-    df = pd.read_excel(file)
-    get_index = find_row_index_by_search_term(df, args.driver)
-    shifts = get_row_as_list(df, get_index[0])
-    dates = rd.generate_sequential_dates(start_date, 28)
-    days = rd.get_day_of_week(dates)
-    clean_shifts = clean_roster_list(shifts)
-  
-    driver_name = clean_shifts[0]
-    clean_shifts = clean_shifts[n:]
-    
-    duty = []
-    for el in zip(days, dates, clean_shifts):
-        
-        check_date = rd.format_date(el[1])
-        check_res = rd.is_date_between(vac_start, vac_fin, check_date)
-
-        if check_res:
-           res = match_vac_shift(el[0], el[2])
-           # print(res)
+    logger.info(f'filename(s):       {", ".join(files)}')
+    all_drivers = args.diff or args.incremental or args.all_drivers or args.summary or args.compliance or args.who or args.cover or args.sqlite
+    logger.info(f'Driver:            {"ALL" if all_drivers else args.driver}')
+    if len(files) > 1:
+        for file in files:
+            if os.path.basename(file) not in jdata.get('rosters', {}):
+                logger.warning(f'{file} has no entry under "rosters" in config.json, using the default dates')
+
+    if args.serve:
+        import rosserve as rsv
+
+        if len(files) > 1:
+            logger.warning(f'--serve uses only the first roster file, {files[0]}')
+        service = rsv.RosterService(lambda: load_depot(files[0]), [files[0], "config.json"] + db_files)
+        rsv.serve(service, args.host, args.port)
+        sys.exit(0)
+
+    out = rrd.open_output(args.output)
+    with prof.stage('load_duty_db'):
+        duty_db = rdb.DutyDatabase(db_files)
+
+    if args.diff:
+        import rosdiff as rdf
+
+        values = {}
+        sides = []
+        for file, date_cfg in zip(files, date_cfgs):
+            with prof.stage('diff_load'):
+                if file.lower().endswith('.json'):
+                    sides.append(rdf.ResolvedRoster.from_state(file, values))
+                else:
+                    calendar, sheet = open_roster(file, date_cfg, n)
+                    sides.append(rdf.ResolvedRoster.from_rosters(calendar.dates, sheet,
+                                                                 iter_driver_rosters(sheet, calendar, duty_db), values))
+        with prof.stage('diff'):
+            result = rdf.diff(sides[0], sides[1], values)
+        rdf.print_diff(result, files[0], files[1], out)
+        if out is not sys.stdout:
+            out.close()
+        if args.profile:
+            prof.report(logger, args.profile)
+        sys.exit(0)
+
+    if args.incremental:
+        import rosincr as rin
+
+        if len(files) > 1:
+            logger.warning(f'--incremental uses only the first roster file, {files[0]}')
+        calendar, sheet = open_roster(files[0], date_cfgs[0], n)
+        with prof.stage('incremental'):
+            state, changes, full = rin.update(rin.load_state(args.incremental), files[0], sheet, calendar, duty_db)
+        rin.print_changes(changes, full, len(sheet.drivers), out)
+        rin.save_state(state, args.incremental)
+        if out is not sys.stdout:
+            out.close()
+        if args.profile:
+            prof.report(logger, args.profile)
+        sys.exit(0)
+
+    store = None
+    if args.sqlite:
+        import rossql as rsq
+
+        store = rsq.RosterStore(args.sqlite)
+        with prof.stage('sqlite'):
+            timetable_id, n_duties = store.load_duties(duty_db, db_files)
+        logger.info(f'Stored {n_duties} duties in {args.sqlite} as timetable {timetable_id}')
+
+    driver = None if all_drivers else args.driver
+    status = 0
+    render = not (args.summary or args.compliance or args.who or args.cover)
+    renderer = rrd.RENDERERS[args.format](out)
+    if render:
+        renderer.begin()
+    for file, calendar, rosters in iter_roster_files(files, date_cfgs, n, duty_db, driver, args.jobs):
+        logger.info(f'filename:          {file}')
+        logger.info(f'Roster Start Date: {calendar.start_date}')
+        for vac_start, vac_fin in calendar.vacations:
+            logger.info(f'Vac Start Date:    {vac_start}')
+            logger.info(f'Vac End   Date:    {vac_fin}')
+        for holiday in sorted(calendar.public_holidays):
+            logger.info(f'Public Holiday:    {holiday}')
+
+        if store is not None:
+            rosters = list(rosters)
+            with prof.stage('sqlite'):
+                period_id = store.save_rosters(file, calendar, rosters, timetable_id)
+            logger.info(f'Stored {len(rosters)} rosters in {args.sqlite} as period {period_id}')
+
+        if args.summary:
+            import rossummary as rsm
+
+            with prof.stage('resolve'):
+                rosters = list(rosters)
+            with prof.stage('summary'):
+                summary = rsm.summarise(rsm.RosterMatrix(rosters, len(calendar), daysoff))
+            with prof.stage('render'):
+                rsm.print_summary(summary, calendar.dates[0], out)
+            count = len(rosters)
+        elif args.compliance:
+            import rossummary as rsm
+            import roscompliance as rco
+
+            with prof.stage('resolve'):
+                rosters = list(rosters)
+            with prof.stage('compliance'):
+                violations = rco.scan(rsm.RosterMatrix(rosters, len(calendar), daysoff, routes=False), calendar.dates,
+                                      rco.compliance_rules(jdata))
+            with prof.stage('render'):
+                rco.print_violations(violations, calendar.dates[0], out)
+            count = len(rosters)
+        elif args.who or args.cover:
+            index = rix.RosterIndex(calendar.dates)
+            with prof.stage('index'):
+                for _ in index.collect(rosters):
+                    pass
+            count = index.drivers
+            dates = rix.dates_on(calendar, args.on)
+            if not dates:
+                logger.warning(f'{args.on} is not in the roster period of {file}')
+            if args.who:
+                with prof.stage('render'):
+                    rix.print_who(index, args.who, dates, calendar.day_names, out)
+            if args.cover:
+                with prof.stage('interval_index'):
+                    intervals = riv.build_interval_indexes(duty_db)
+                result = riv.cover(calendar, index, intervals, *window, dates, daysoff, args.within)
+                with prof.stage('render'):
+                    riv.print_cover(result, *window, file=out)
         else:
-            res = match_term_shift(el[0], el[2])
-            # print(res)
-            
-        duty.append(res)
-                     
-    pretty_print(driver_name,dates, days, duty)
-  
\ No newline at end of file
+            count = 0
+            for driver_name, duty in rosters:
+                with prof.stage('render'):
+                    renderer.driver(driver_name, calendar.dates, calendar.day_names, duty)
+                count += 1
+
+        if driver is not None and count == 0:
+            logger.error(f'Driver {driver} not found in {file}')
+            status = 1
+        logger.info(f'Drivers processed: {count}')
+        prof.count('drivers', count)
+        prof.count('roster_files')
+
+    if render:
+        renderer.end()
+    if out is not sys.stdout:
+        out.close()
+    if store is not None:
+        store.close()
+
+    if args.profile:
+        prof.report(logger, args.profile)
+    sys.exit(status)
@@ -6,7 +6,30 @@ Created on Thu Jun 19 21:08:03 2025
 """
 
 import os
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
 import rosroutes as rr
+import rosutils as ru
+import rosdb as rdb
+
+journal_db_files = [('00_mon_thu_journals.txt', '10_mon_thu-db.txt'),
+                    ('01_fri_journals.txt', '11_fri-db.txt'),
+                    ('02_sat_journals.txt', '12_sat-db.txt'),
+                    ('03_sun_journals.txt', '13_sun-db.txt'),
+                    ('04_mon_fri_vac_journals.txt', '14_mon_fri_vac-db.txt')]
+DB_MANIFEST = 'db_manifest.json'
+# bump when the journal parser or the db line format changes, so db files
+# built by an older version are rebuilt
+DB_FORMAT_VERSION = 1
+DEPOT_DELIMITER = 'Depot:  MONA VALE BUS DEPOT'
+
+# WordprocessingML tags, as ElementTree names them
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_BODY, W_P, W_T, W_TAB, W_BR, W_CR = (W_NS + tag for tag in ('body', 'p', 't', 'tab', 'br', 'cr'))
 
 def find_first_and_last_colon_word(text_string):
     """
@@ -39,125 +62,308 @@ def find_first_and_last_colon_word(text_string):
     return first_colon_word, last_colon_word
 
 
-def extract_text_between_words(file_path, start_word, end_word, duty):
+def parse_journal_block(block, start_word='Spread', end_word='Route'):
     """
-    Searches a text file for occurrences of a start word and an end word,
-    and extracts all text found between them, concatenating it into a single string.
-    The search for start and end words is case-insensitive.
+    Parses one journal block (one duty) into a DutyRecord.
 
     Args:
-        file_path (str): The path to the text file.
-        start_word (str): The word that marks the beginning of the text to extract.
-        end_word (str): The word that marks the end of the text to extract.
+        block (str): The text of a block, starting at the depot line.
+        start_word (str): The word after which the sign on/off times start.
+        end_word (str): The word that ends the sign on/off times.
 
     Returns:
-        str: A single string containing all concatenated text segments found
-             between the start and end words. Returns an empty string if the
-             file is not found, or if the words/patterns are not present.
+        DutyRecord or None: The duty code, first and last times between
+                            start_word and end_word, base routes (from
+                            rosroutes.routes) and school runs, or None if
+                            the block has no duty or times.
     """
-    if not os.path.exists(file_path):
-        print(f"Error: File not found at '{file_path}'")
-        return ""
+    block_lower = block.lower()
+
+    duty_index = block_lower.find('duty')
+    if duty_index == -1:
+        return None
+    duty_line = block[duty_index:].split('\n', 1)[0]
+    duty = rdb.duty_code_from_line(duty_line)
+
+    start_index = block_lower.find(start_word.lower())
+    if start_index == -1:
+        return None
+    start_index += len(start_word)
+    end_index = block_lower.find(end_word.lower(), start_index)
+    if end_index == -1:
+        print(f"Warning: Found '{start_word}' but no matching '{end_word}' afterwards in duty {duty}.")
+        return None
+
+    sign_on, sign_off = find_first_and_last_colon_word(block[start_index:end_index])
+    if duty is None or sign_on is None:
+        return None
+
+    base_routes, school_runs = rr.get_route_matcher(rr.routes).scan(block)
+    record = rdb.DutyRecord.from_parts(duty, sign_on, sign_off, base_routes, school_runs)
+    if record is None:
+        print(f"Warning: could not read the times '{sign_on}' and '{sign_off}' of duty {duty}.")
+    return record
+
+
+def iter_docx_paragraphs(file_path):
+    """
+    Streams the paragraphs of a .docx file as plain text.
 
-    try:
-        with open(file_path, 'r') as file:
-            full_text = file.read()
+    word/document.xml is read straight out of the zip and parsed
+    incrementally; each paragraph is cleared once its text has been handed
+    out, so the document tree is never built in memory.
 
-        extracted_segments = []
-        duty_index = 0
-        # Convert search words to lowercase for case-insensitive matching
-        start_word_lower = start_word.lower()
-        end_word_lower = end_word.lower()
+    Args:
+        file_path (str): The path to the .docx file.
 
-        # We need to search through the text, keeping track of our position
-        current_position = 0
-        while True:
-            # Find the start word, case-insensitive
-            start_index = full_text.lower().find(start_word_lower, current_position)
+    Yields:
+        str: The text of each paragraph, with w:tab as a tab and w:br/w:cr
+             as a line break.
+    """
+    with zipfile.ZipFile(file_path) as docx:
+        with docx.open('word/document.xml') as xml_file:
+            body = None
+            parts = []
+            for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == W_BODY:
+                        body = elem
+                    continue
+
+                tag = elem.tag
+                if tag == W_T:
+                    parts.append(elem.text or '')
+                elif tag == W_TAB:
+                    parts.append('\t')
+                elif tag == W_BR or tag == W_CR:
+                    parts.append('\n')
+                elif tag == W_P:
+                    yield ''.join(parts)
+                    parts = []
+                    elem.clear()
+
+                # drop each finished top-level paragraph or table from the body
+                if body is not None and len(body) and body[-1] is elem:
+                    body.clear()
+
+
+def iter_docx_blocks(file_path, delimiter=DEPOT_DELIMITER):
+    """
+    Groups the paragraphs of a .docx journal into blocks, the same way
+    rosroutes.iter_text_blocks splits a .txt journal.
 
-            if start_index == -1:
-                # No more start words found
-                break
+    Yields:
+        str: The text of each block, stripped of surrounding whitespace.
+    """
+    lines = None
+    for paragraph in iter_docx_paragraphs(file_path):
+        if paragraph.strip().startswith(delimiter):
+            if lines is not None:
+                yield '\n'.join(lines).strip()
+            lines = [paragraph]
+        elif lines is not None:
+            lines.append(paragraph)
 
-            # Adjust start_index to point to the end of the actual (case-sensitive) start_word
-            # This ensures we get the text *after* the start_word
-            actual_start_word_end_index = start_index + len(start_word)
+    if lines is not None:
+        yield '\n'.join(lines).strip()
 
-            # Find the end word, starting from after the start word
-            end_index = full_text.lower().find(end_word_lower, actual_start_word_end_index)
 
-            if end_index == -1:
-                # Start word found, but no corresponding end word after it in the rest of the text
-                print(f"Warning: Found '{start_word}' but no matching '{end_word}' afterwards.")
-                break # Exit loop as we can't find further complete segments
+def iter_journal_blocks(file_path):
+    """
+    Yields the duty blocks of a journal, read natively from a .docx file or
+    from a text export.
+    """
+    if file_path.lower().endswith('.docx'):
+        return iter_docx_blocks(file_path)
+    return rr.iter_text_blocks(file_path, DEPOT_DELIMITER)
+
 
-            # Extract the text between the end of the start word and the beginning of the end word
-            segment = full_text[actual_start_word_end_index:end_index]
-            #extracted_segments.append("-----------------------------------\n")
-            # extracted_segments.append(duty[duty_index] + " ")
-            first_colon_word, last_colon_word = find_first_and_last_colon_word(segment)
-            extracted_segments.append(duty[duty_index] + "  "+ first_colon_word + "  " + last_colon_word)
-            duty_index += 1
-            
+def journal_source(journal_file):
+    """
+    Returns the file to build a db from: the Word journal next to the text
+    export (same name, .docx) when there is one, otherwise the export.
+    """
+    docx_file = os.path.splitext(journal_file)[0] + '.docx'
+    if os.path.exists(docx_file):
+        return docx_file
+    return journal_file
 
-            # Update current_position to search for the next pair after the current end word
-            current_position = end_index + len(end_word)
 
-        return extracted_segments
+def iter_duty_records(file_path, start_word='Spread', end_word='Route'):
+    """
+    Reads a journal file once and yields a DutyRecord for each duty in it.
+
+    The file is streamed block by block, so the duty line, the sign on/off
+    times and the routes all come out of the same single read. Word (.docx)
+    journals are read directly, without exporting them to text first.
+
+    Args:
+        file_path (str): The path to the journal, .docx or text.
+        start_word (str): The word after which the sign on/off times start.
+        end_word (str): The word that ends the sign on/off times.
+
+    Yields:
+        DutyRecord: One record per duty block, in file order.
+    """
+    for block in iter_journal_blocks(file_path):
+        record = parse_journal_block(block, start_word, end_word)
+        if record is not None:
+            yield record
+
+
+def format_db_line(record):
+    """
+    Formats a DutyRecord as a line of a *-db.txt duty database, e.g.
+    'Duty:  H166  7:23  19:13 199 192 155 B1 156 790n 715n 667n'.
+    """
+    return str(record)
 
-    except Exception as e:
-        print(f"An error occurred while processing the file: {e}")
-        return ""
-    
 
-def search_word_in_file(file_path, search_word):
+def write_db_file(journal_file, db_file):
     """
-    Searches a text file for occurrences of a specific word (case-insensitive)
-    and returns a list of lines containing that word.
+    Builds a duty database from a journal file.
 
     Args:
-        file_path (str): The path to the text file.
-        search_word (str): The word to search for.
+        journal_file (str): The path to the journal, .docx or text.
+        db_file (str): The path of the *-db.txt file to write.
 
     Returns:
-        list: A list of strings, where each string is a line from the file
-              that contains the search word. Returns an empty list if the
-              file is not found or the word is not present.
+        int: The number of duties written.
     """
-    found_lines = []
-    # Convert the search word to lowercase for case-insensitive matching
-    search_word_lower = search_word.lower()
+    count = 0
+    # write next to the target and swap it in, so readers never see half a db
+    tmp_file = db_file + '.tmp'
+    try:
+        with open(tmp_file, 'w') as f:
+            for record in iter_duty_records(journal_file):
+                f.write(format_db_line(record) + '\n')
+                count += 1
+        os.replace(tmp_file, db_file)
+    except Exception:
+        # leave the old db file as it was and no half-written copy behind
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    return count
+
+
+def load_manifest(manifest_file):
+    if not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring unreadable manifest '{manifest_file}': {e}")
+        return {}
 
-    if not os.path.exists(file_path):
-        print(f"Error: File not found at '{file_path}'")
-        return []
 
-    try:
-        with open(file_path, 'r') as file:
-            for line_num, line in enumerate(file, 1):
-                # Check if the lowercase version of the line contains the lowercase search word
-                if search_word_lower in line.lower():
-                    found_lines.append(line.strip()) # .strip() removes leading/trailing whitespace and newlines
-        return found_lines
-    except Exception as e:
-        print(f"An error occurred while reading the file: {e}")
-        return []
-
-filename = '04_mon_fri_vac_journals.txt'
-duty = search_word_in_file(filename, 'Duty')
-times = extract_text_between_words(filename, 'Spread', 'Route', duty)
-print(times)
-base_routes = rr.create_routes_list(filename)
-ss = ''
-for item in zip(times, base_routes):
-    s = item[0]
-    for route in item[1]:
-        s += " " + route
-    ss += s + '\n'
-
-f = open('14_mon_fri_vac-db.txt', 'w')
-f.write(ss)
-f.close()
+def journal_is_stale(journal_file, db_file, entry):
+    """
+    Decides whether a db file has to be rebuilt from its journal.
+
+    A db file built by another DB_FORMAT_VERSION is always stale. Otherwise
+    the size and mtime recorded in the manifest are checked first; only when
+    they differ is the journal hashed, so touching a file without changing it
+    does not trigger a rebuild.
+
+    Args:
+        journal_file (str): The path to the journal.
+        db_file (str): The path to the db file built from it.
+        entry (dict): The manifest entry for the journal, or None.
+
+    Returns:
+        tuple: (stale, digest) where digest is the journal's hash if it had
+               to be computed, else None.
+    """
+    if (entry is None or entry.get('format') != DB_FORMAT_VERSION
+            or entry.get('db_file') != db_file or not os.path.exists(db_file)):
+        return True, None
 
+    st = os.stat(journal_file)
+    if st.st_size == entry.get('size') and st.st_mtime_ns == entry.get('mtime_ns'):
+        return False, None
 
+    digest = ru.file_digest(journal_file)
+    return digest != entry.get('sha256'), digest
 
+
+def _build_one(journal_file, db_file):
+    return write_db_file(journal_file, db_file), ru.file_digest(journal_file)
+
+
+def build_db(pairs=journal_db_files, manifest_file=DB_MANIFEST, jobs=None, force=False):
+    """
+    Rebuilds every duty database whose journal changed since the last build.
+
+    Stale journals are parsed in parallel in a process pool. The manifest
+    records the size, mtime and SHA-256 of each journal that was built and
+    the DB_FORMAT_VERSION it was built with. A Word journal (.docx) next
+    to a text export is used in its place.
+
+    Args:
+        pairs (list[tuple]): (journal file, db file) pairs to build.
+        manifest_file (str): The path to the build manifest.
+        jobs (int): Number of worker processes, default one per CPU.
+        force (bool): Rebuild everything regardless of the manifest.
+
+    Returns:
+        dict: db file -> number of duties written, for the rebuilt files only.
+    """
+    manifest = load_manifest(manifest_file)
+
+    stale = []
+    for journal_file, db_file in pairs:
+        journal_file = journal_source(journal_file)
+        if not os.path.exists(journal_file):
+            print(f"Error: File not found at '{journal_file}'")
+            continue
+
+        entry = manifest.get(journal_file)
+        is_stale, digest = (True, None) if force else journal_is_stale(journal_file, db_file, entry)
+        if is_stale:
+            stale.append((journal_file, db_file))
+        elif digest is not None:
+            # contents unchanged, only the timestamp moved
+            st = os.stat(journal_file)
+            entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+
+    built = {}
+    if stale:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [(journal_file, db_file, pool.submit(_build_one, journal_file, db_file))
+                       for journal_file, db_file in stale]
+            for journal_file, db_file, future in futures:
+                try:
+                    count, digest = future.result()
+                except Exception as e:
+                    print(f"An error occurred while building '{db_file}': {e}")
+                    continue
+                st = os.stat(journal_file)
+                manifest[journal_file] = {'db_file': db_file, 'format': DB_FORMAT_VERSION, 'size': st.st_size,
+                                          'mtime_ns': st.st_mtime_ns, 'sha256': digest}
+                built[db_file] = count
+
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=4)
+
+    return built
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='build the duty databases from the journals',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('command', nargs='?', default='build-db', choices=['build-db'], help='command to run')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes. Default is one per CPU.')
+    parser.add_argument('-f', '--force', action='store_true', help='rebuild every db file, even if its journal is unchanged')
+    parser.add_argument('-m', '--manifest', default=DB_MANIFEST, help='build manifest file')
+
+    args = parser.parse_args()
+
+    built = build_db(manifest_file=args.manifest, jobs=args.jobs, force=args.force)
+    for db_file, count in built.items():
+        print(f"{count} duties written to '{db_file}'")
+    if not built:
+        print("All duty databases are up to date")
+    sys.exit(0)
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the roster pipeline on synthetic depot-scale inputs.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+import main as mn
+import parse_docx as pdx
+import rosdate as rd
+import rosdb as rdb
+import rosroutes as rr
+import rossheet as rs
+
+BENCH_OUTPUT = 'bench_results.json'
+DEPOT_LINE = 'Depot:  MONA VALE BUS DEPOT'
+
+# duty code prefix and first number for each journal, in journal_db_files order
+journal_codes = [('H', 100), ('H', 300), ('H', 500), ('H', 700), ('D', 100)]
+# the roster cleaning cuts codes starting with D or H to 4 characters, so
+# each journal holds at most 200 of those; past that its codes continue
+# with a prefix of its own that is left alone, then two-letter prefixes
+overflow_prefixes = ['M', 'N', 'P', 'R', 'S']
+BASE_DUTIES = 200
+
+
+def duty_codes(journal, m_duties):
+    """
+    Returns m_duties distinct duty codes for a journal (an index into
+    journal_db_files), all matching the roster's duty code pattern.
+    """
+    prefix, first_code = journal_codes[journal]
+    codes = [f'{prefix}{first_code + k}' for k in range(min(m_duties, BASE_DUTIES))]
+
+    letter = overflow_prefixes[journal]
+    for extra in [letter] + [letter + c for c in string.ascii_uppercase]:
+        for number in range(100, 10000):
+            if len(codes) == m_duties:
+                return codes
+            codes.append(f'{extra}{number}')
+    raise ValueError(f'at most {len(codes)} duty codes per journal')
+
+
+def make_journal(file_path, codes, rng):
+    """
+    Writes a synthetic journal with one duty block per code, in the export
+    format parse_docx reads: a depot line, the duty, sign on/off times between
+    'Spread' and 'Route', then the routes and school runs worked. Like a
+    Word text export, every page after the first starts with a form feed.
+
+    Returns:
+        list[str]: The duty codes written.
+    """
+    with open(file_path, 'w') as f:
+        f.write('Journal export\n')
+        for k, code in enumerate(codes):
+            sign_on = rng.randint(270, 660)
+            sign_off = sign_on + rng.randint(360, 740)
+            page_break = '\f' if k else ''
+            f.write(f'{page_break}{DEPOT_LINE}            Page {k + 1}\n')
+            f.write(f'Duty:  {code}\n')
+            f.write('Sign On   Spread   Sign Off\n')
+            f.write(f'  {sign_on // 60}:{sign_on % 60:02d}   {sign_off // 60}:{sign_off % 60:02d}\n')
+            f.write('Route   Run   Depart\n')
+            for route in rng.sample(rr.routes, rng.randint(1, 4)):
+                depart = rng.randint(sign_on, sign_off)
+                f.write(f'  {route}    {rng.randint(1, 60)}    {depart // 60}:{depart % 60:02d}\n')
+            for _ in range(rng.randint(0, 3)):
+                f.write(f'  {rng.randint(600, 799)}n   school\n')
+    return codes
+
+
+def make_roster(file_path, n_drivers, start_date, n_days, calendar, codes, rng, off_rate=0.3):
+    """
+    Writes a synthetic roster workbook in the dave_roster layout: a title
+    row, a header row, then one row per driver with name, line, grade and
+    one duty or day-off code per day. Some duty cells carry a trailing route
+    ('H860\\nB1') like the real sheets, to exercise the cleaning.
+    """
+    rows = [['MONA VALE ROSTER'], ['Name', 'Line', 'Grade'] +
+            [(start_date + timedelta(days=i)).strftime('%d-%m') for i in range(n_days)]]
+    for i in range(n_drivers):
+        row = [f'DRIVER{i:05d}, A B', i + 1, 'FT']
+        for day in calendar:
+            if rng.random() < off_rate:
+                row.append(rng.choice(mn.daysoff))
+                continue
+            code = rng.choice(codes[day.day_type])
+            if rng.random() < 0.2:
+                code += '\n' + rng.choice(rr.routes)
+            row.append(code)
+        rows.append(row)
+    pd.DataFrame(rows).to_excel(file_path, header=False, index=False)
+
+
+def time_stage(results, name, repeat, func):
+    """
+    Runs func repeat times, records the wall times under name and returns
+    the result of the last run.
+    """
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = func()
+        runs.append(time.perf_counter() - t0)
+    results[name] = {'min': min(runs), 'mean': sum(runs) / len(runs), 'runs': runs}
+    return res
+
+
+def run_benchmark(n_drivers, n_days, m_duties, repeat=3, seed=1, work_dir=None):
+    """
+    Generates synthetic inputs at the requested scale and times each stage
+    of the pipeline on them.
+
+    Args:
+        n_drivers (int): Drivers in the roster workbook.
+        n_days (int): Days in the roster period.
+        m_duties (int): Duty blocks in each of the five journals.
+        repeat (int): Runs per stage; min and mean are reported.
+        seed (int): Seed for the synthetic data.
+        work_dir (str): Where to write the inputs, default a temp dir that is
+                        removed afterwards.
+
+    Returns:
+        dict: Parameters, environment and per-stage timings in seconds.
+    """
+    rng = random.Random(seed)
+    tmp_dir = work_dir or tempfile.mkdtemp(prefix='rosbench-')
+    start_date = date(2025, 6, 22)
+
+    try:
+        db_paths = [os.path.join(tmp_dir, f) for f in mn.db_files]
+        calendar = rd.RosterCalendar(start_date, n_days, db_paths,
+                                     vacations=[(start_date + timedelta(days=14), start_date + timedelta(days=27))])
+
+        codes = []
+        pairs = []
+        for journal, (journal_file, db_file) in enumerate(pdx.journal_db_files):
+            journal_path = os.path.join(tmp_dir, journal_file)
+            codes.append(make_journal(journal_path, duty_codes(journal, m_duties), rng))
+            pairs.append((journal_path, os.path.join(tmp_dir, db_file)))
+
+        roster_file = os.path.join(tmp_dir, 'roster.xlsx')
+        make_roster(roster_file, n_drivers, start_date, n_days, calendar, codes, rng)
+
+        stages = {}
+        n = 3
+
+        def parse_journals():
+            return sum(pdx.write_db_file(journal_path, db_path) for journal_path, db_path in pairs)
+        parsed = time_stage(stages, 'parse_docx', repeat, parse_journals)
+        # every generated duty has to come back out of the journals
+        if parsed != sum(len(c) for c in codes):
+            raise RuntimeError(f'parsed {parsed} duties from the journals, expected {sum(len(c) for c in codes)}')
+
+        df = time_stage(stages, 'read_excel', repeat, lambda: pd.read_excel(roster_file))
+        sheet = time_stage(stages, 'clean_sheet', repeat, lambda: rs.RosterSheet(df, mn.daysoff, n, n_days))
+
+        def clean_rows():
+            return [mn.clean_roster_list(list(row)) for row in df.itertuples(index=False)]
+        time_stage(stages, 'clean_roster_list', repeat, clean_rows)
+
+        names = list(sheet.drivers)
+        time_stage(stages, 'driver_lookup', repeat, lambda: [sheet.find_rows(name.split(',')[0]) for name in names])
+
+        time_stage(stages, 'load_duty_db', repeat, lambda: rdb.DutyDatabase(db_paths, use_cache=False))
+        duty_db = rdb.DutyDatabase(db_paths, use_cache=False)
+        rosters = time_stage(stages, 'shift_matching', repeat,
+                             lambda: list(mn.iter_driver_rosters(sheet, calendar, duty_db)))
+
+        def render():
+            with contextlib.redirect_stdout(io.StringIO()):
+                for driver_name, duty in rosters:
+                    mn.pretty_print(driver_name, calendar.dates, calendar.day_names, duty)
+        time_stage(stages, 'pretty_print', repeat, render)
+
+    finally:
+        if work_dir is None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return {'version': mn.__version__,
+            'params': {'drivers': n_drivers, 'days': n_days, 'duties': m_duties, 'repeat': repeat, 'seed': seed},
+            'platform': {'system': platform.system(), 'python': platform.python_version(), 'pandas': pd.__version__},
+            'stages': stages}
+
+
+def compare(results, baseline):
+    """
+    Prints each stage's min time against a baseline results file.
+    """
+    print(f"{'stage':<20}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, cur in results['stages'].items():
+        old = baseline['stages'].get(name)
+        if old is None:
+            print(f"{name:<20}{'-':>12}{cur['min']:>12.6f}{'-':>8}")
+            continue
+        ratio = cur['min'] / old['min'] if old['min'] else float('inf')
+        print(f"{name:<20}{old['min']:>12.6f}{cur['min']:>12.6f}{ratio:>8.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark the roster pipeline on synthetic data',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-n', '--drivers', type=int, default=300, help='number of drivers')
+    parser.add_argument('-D', '--days', type=int, default=mn.ROSTER_DAYS, help='number of days')
+    parser.add_argument('-m', '--duties', type=int, default=200, help='duty blocks per journal')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='runs per stage')
+    parser.add_argument('-s', '--seed', type=int, default=1, help='random seed')
+    parser.add_argument('-o', '--output', default=BENCH_OUTPUT, help='JSON results file')
+    parser.add_argument('-c', '--compare', metavar='RESULTS', help='earlier results file to compare against')
+    parser.add_argument('-k', '--keep', metavar='DIR', help='write the synthetic inputs to DIR and keep them')
+
+    args = parser.parse_args()
+    if args.duties < 1:
+        parser.error('--duties must be at least 1')
+
+    if args.keep:
+        os.makedirs(args.keep, exist_ok=True)
+
+    results = run_benchmark(args.drivers, args.days, args.duties, args.repeat, args.seed, args.keep)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            compare(results, json.load(f))
+    else:
+        for name, stage in results['stages'].items():
+            print(f"{name:<20}{stage['min']:>12.6f} s")
+    sys.exit(0)
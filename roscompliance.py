@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Compliance checks (rest, spread, consecutive days) over a resolved roster.
+"""
+
+import numpy as np
+
+import rosdb as rdb
+import rossummary as rsm
+
+DAY_MINUTES = 24 * 60
+
+# used for any rule missing from the "compliance" section of config.json
+DEFAULT_RULES = {'min_rest_hours': 10, 'max_spread_hours': 12, 'max_consecutive_days': 6}
+
+MIN_REST, MAX_SPREAD, CONSECUTIVE_DAYS, UNRESOLVED = 'min_rest', 'max_spread', 'consecutive_days', 'unresolved'
+
+
+def compliance_rules(jdata):
+    """
+    Returns the compliance limits: the "compliance" section of config.json
+    over the defaults.
+    """
+    rules = dict(DEFAULT_RULES)
+    rules.update(jdata.get('compliance', {}))
+    return rules
+
+
+def scan(matrix, dates, rules):
+    """
+    Checks every driver and day of a roster period in one pass over the
+    RosterMatrix arrays.
+
+    Rules:
+        min_rest: rest from one day's sign off to the next day's sign on
+                  below min_rest_hours (duties on both days).
+        max_spread: sign on to sign off above max_spread_hours.
+        consecutive_days: more than max_consecutive_days working days in a
+                  row; a shift that could not be resolved counts as working.
+                  Reported once, on the first day over the limit.
+        unresolved: a shift missing from the duty database.
+
+    Args:
+        matrix: The rossummary.RosterMatrix of the roster.
+        dates (list[str]): The roster dates, 'dd-mm-yyyy'.
+        rules (dict): The limits, see DEFAULT_RULES.
+
+    Returns:
+        list[dict]: One entry per violation with 'driver', 'date', 'rule'
+                    and 'detail', ordered by driver then date.
+    """
+    n_drivers, n_days = matrix.kind.shape
+    min_rest = int(rules['min_rest_hours'] * 60)
+    max_spread = int(rules['max_spread_hours'] * 60)
+    max_days = int(rules['max_consecutive_days'])
+
+    on_duty = matrix.kind == rsm.DUTY
+    sign_on = matrix.sign_on.astype(np.int32)
+    sign_off = sign_on + matrix.spread
+
+    # rest between day d and day d + 1, flagged on day d + 1
+    both = on_duty[:, :-1] & on_duty[:, 1:]
+    rest = DAY_MINUTES + sign_on[:, 1:] - sign_off[:, :-1]
+    rest_driver, rest_day = np.nonzero(both & (rest < min_rest))
+    rest_values = rest[rest_driver, rest_day]
+    rest_day = rest_day + 1
+
+    spread_driver, spread_day = np.nonzero(on_duty & (matrix.spread > max_spread))
+    spread_values = matrix.spread[spread_driver, spread_day]
+
+    # length of the working run ending at each day, and of the whole run
+    working = on_duty | (matrix.kind == rsm.UNRESOLVED)
+    idx = np.arange(n_days)
+    last_break = np.maximum.accumulate(np.where(working, -1, idx), axis=1)
+    next_break = np.minimum.accumulate(np.where(working, n_days, idx)[:, ::-1], axis=1)[:, ::-1]
+    run_len = idx - last_break
+    run_total = next_break - last_break - 1
+    days_driver, days_day = np.nonzero(working & (run_len == max_days + 1))
+    days_values = run_total[days_driver, days_day]
+
+    unres_driver, unres_day = np.nonzero(matrix.kind == rsm.UNRESOLVED)
+
+    rule_names = [MIN_REST, MAX_SPREAD, CONSECUTIVE_DAYS, UNRESOLVED]
+    drivers = np.concatenate((rest_driver, spread_driver, days_driver, unres_driver))
+    days = np.concatenate((rest_day, spread_day, days_day, unres_day))
+    rule = np.repeat(np.arange(4), [len(rest_driver), len(spread_driver), len(days_driver), len(unres_driver)])
+    values = np.concatenate((rest_values, spread_values, days_values, np.zeros(len(unres_driver), dtype=np.int64)))
+
+    violations = []
+    for i in np.lexsort((rule, days, drivers)):
+        r, value = rule_names[rule[i]], int(values[i])
+        if r == MIN_REST:
+            detail = f"{rdb.format_time(value)} rest, minimum {rdb.format_time(min_rest)}"
+        elif r == MAX_SPREAD:
+            detail = f"{rdb.format_time(value)} spread, maximum {rdb.format_time(max_spread)}"
+        elif r == CONSECUTIVE_DAYS:
+            detail = f"{value} working days in a row, maximum {max_days}"
+        else:
+            detail = "shift not found in the duty database"
+        violations.append({'driver': matrix.drivers[drivers[i]], 'date': dates[days[i]], 'rule': r, 'detail': detail})
+    return violations
+
+
+def print_violations(violations, roster_start, file=None):
+    """
+    Prints the violations found by scan, one per line.
+    """
+    print(f"Compliance, roster start date {roster_start}: {len(violations)} violation(s)", file=file)
+    for v in violations:
+        print(f"| {v['driver']:<24} | {v['date']} | {v['rule']:<16} | {v['detail']}", file=file)
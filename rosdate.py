@@ -4,6 +4,7 @@ Created on Wed Jun 25 21:56:38 2025
 
 @author: david
 """
+from collections import namedtuple
 from datetime import datetime, timedelta, date
 
 def format_date(date: str) -> date:
@@ -91,3 +92,102 @@ def generate_sequential_dates(start_date_str: str, n_days: int, is_vac=False) ->
         date_list.append(date_str)
 
     return date_list
+
+
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# day-types, in the same order as the db files they are matched against
+MON_THU, FRI, SAT, SUN, MON_FRI_VAC = range(5)
+
+RosterDay = namedtuple('RosterDay', ['date', 'date_str', 'day', 'day_type', 'db_file', 'is_vac', 'is_holiday'])
+
+
+class RosterCalendar:
+    """
+    The days of one roster period, worked out once and shared by every driver.
+
+    For each day it holds the date, its 'dd-mm-yyyy' string, the weekday
+    name and the day-type, which selects the duty database to match against:
+    Mon-Thu, Fri, Sat, Sun, or the Mon-Fri school vacation timetable. Public
+    holidays run the Sunday timetable.
+    """
+
+    def __init__(self, start_date: date, n_days: int, db_files: list[str],
+                 vacations: list[tuple[date, date]] = (), public_holidays: list[date] = ()):
+        """
+        Args:
+            start_date: The first day of the roster.
+            n_days: The number of days in the roster.
+            db_files: The db file for each day-type, indexed by MON_THU .. MON_FRI_VAC.
+            vacations: (first day, last day) of each school vacation, inclusive.
+            public_holidays: The public holidays.
+        """
+        self.start_date = start_date
+        self.vacations = list(vacations)
+        self.public_holidays = set(public_holidays)
+        self.db_files = db_files
+
+        self.days = []
+        for i in range(n_days):
+            d = start_date + timedelta(days=i)
+            is_vac = any(is_date_between(start, finish, d) for start, finish in self.vacations)
+            is_holiday = d in self.public_holidays
+            day_type = get_day_type(d.weekday(), is_vac, is_holiday)
+            self.days.append(RosterDay(d, d.strftime("%d-%m-%Y"), DAY_NAMES[d.weekday()],
+                                       day_type, db_files[day_type], is_vac, is_holiday))
+
+        self.dates = [day.date_str for day in self.days]
+        self.day_names = [day.day for day in self.days]
+        self.day_db_files = [day.db_file for day in self.days]
+
+    @classmethod
+    def from_config(cls, date_cfg: dict, db_files: list[str], n_days: int):
+        """
+        Builds the calendar from the "date" section of config.json.
+
+        Besides roster_start, vac_start and vac_finish the section may hold
+        "vacations", a list of {"start": ..., "finish": ...} windows, and
+        "public_holidays", a list of dates, all in 'dd-mm-yyyy' format.
+        """
+        vacations = []
+        if 'vac_start' in date_cfg and 'vac_finish' in date_cfg:
+            vacations.append((format_date(date_cfg['vac_start']), format_date(date_cfg['vac_finish'])))
+        for window in date_cfg.get('vacations', []):
+            vacations.append((format_date(window['start']), format_date(window['finish'])))
+
+        public_holidays = [format_date(d) for d in date_cfg.get('public_holidays', [])]
+
+        return cls(format_date(date_cfg['roster_start']), n_days, db_files, vacations, public_holidays)
+
+    def __len__(self):
+        return len(self.days)
+
+    def __iter__(self):
+        return iter(self.days)
+
+    def __getitem__(self, i):
+        return self.days[i]
+
+
+def get_day_type(weekday: int, is_vac: bool, is_holiday: bool = False) -> int:
+    """
+    Works out the day-type of a day.
+
+    Args:
+        weekday: Day of the week, Monday is 0 and Sunday is 6.
+        is_vac: True if the day falls in a school vacation.
+        is_holiday: True if the day is a public holiday.
+
+    Returns:
+        One of MON_THU, FRI, SAT, SUN or MON_FRI_VAC.
+    """
+    if is_holiday or weekday == 6:
+        return SUN
+    elif weekday == 5:
+        return SAT
+    elif is_vac: #Mon-Fri share one vacation timetable
+        return MON_FRI_VAC
+    elif weekday == 4:
+        return FRI
+    else:
+        return MON_THU
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory duty databases, indexed by duty code.
+"""
+
+import os
+import pickle
+import re
+from array import array
+import rosprof as rp
+import rosroutes as rr
+
+# bump when the layout of the pickled index changes
+CACHE_VERSION = 3
+
+# the marker DutyDatabase.find returns for a shift missing from the db
+not_found_regex = re.compile(r'^\*\*\* (.*) Shift not found \*\*\*$')
+
+time_pattern = re.compile(r'(\d{1,2}):(\d{2})')
+school_run_pattern = re.compile(r'^(\d{3})n$')
+
+
+def duty_code_from_line(line):
+    """
+    Extracts the duty code from a line of a ``*-db.txt`` duty database.
+
+    Lines look like ``Duty:  H166  7:23  19:13 199 192 155 B1 156 790n``,
+    the ``Duty:`` prefix is optional.
+
+    Args:
+        line (str): A single line from a duty database.
+
+    Returns:
+        str or None: The upper-cased duty code (e.g. 'H166'), or None if the
+                     line does not contain one.
+    """
+    tokens = line.split()
+    if not tokens:
+        return None
+
+    if tokens[0].lower().startswith('duty'):
+        # either 'Duty:' 'H166' or 'Duty:H166'
+        rest = tokens[0][4:].lstrip(':')
+        if rest:
+            return rest.upper()
+        if len(tokens) < 2:
+            return None
+        return tokens[1].upper()
+
+    return tokens[0].upper()
+
+
+def parse_time(text):
+    """
+    Converts a 'h:mm' time to minutes since midnight, or None if text does
+    not hold one.
+    """
+    m = time_pattern.search(text)
+    if m is None:
+        return None
+    return int(m.group(1)) * 60 + int(m.group(2))
+
+
+def format_time(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+class DutyRecord:
+    """
+    One duty of a duty database in compact, typed form.
+
+    Attributes:
+        code (str): The duty code, e.g. 'H166'.
+        sign_on (int): Sign on time in minutes since midnight.
+        sign_off (int): Sign off time in minutes since midnight.
+        routes (int): Base routes worked, as a bitmask over rosroutes.routes.
+        extra_routes (tuple[str]): Routes worked that are not in
+            rosroutes.routes, kept as text so no route is lost.
+        school_runs (array): School run numbers, e.g. 790 for '790n'.
+
+    str() gives the db line, e.g. 'Duty:  H166  7:23  19:13 199 B1 790n'.
+    """
+
+    __slots__ = ('code', 'sign_on', 'sign_off', 'routes', 'school_runs', 'extra_routes')
+
+    def __init__(self, code, sign_on, sign_off, routes=0, school_runs=(), extra_routes=()):
+        self.code = code
+        self.sign_on = sign_on
+        self.sign_off = sign_off
+        self.routes = routes
+        self.school_runs = array('H', school_runs)
+        self.extra_routes = tuple(extra_routes)
+
+    @classmethod
+    def from_parts(cls, code, sign_on, sign_off, route_names, school_runs):
+        """
+        Builds a record from the text the journal parser extracts.
+
+        Args:
+            code (str): The duty code.
+            sign_on (str): Sign on time, 'h:mm'.
+            sign_off (str): Sign off time, 'h:mm'.
+            route_names (list[str]): Base routes, e.g. ['199', 'B1']. Names
+                                     not in rosroutes.routes go to extra_routes.
+            school_runs (list[str]): School runs, e.g. ['790n'].
+
+        Returns:
+            DutyRecord or None: None if either time cannot be read.
+        """
+        on, off = parse_time(sign_on), parse_time(sign_off)
+        if on is None or off is None:
+            return None
+        # the bitmask only covers the catalogue, anything else is kept as text
+        extra_routes = [name for name in route_names if name not in rr.routes]
+        return cls(code.upper(), on, off, rr.routes_to_mask(route_names),
+                   [int(run[:3]) for run in school_runs], extra_routes)
+
+    @classmethod
+    def from_line(cls, line):
+        """
+        Parses a line of a *-db.txt duty database.
+
+        Returns:
+            DutyRecord or None: None if the line has no duty code or times.
+        """
+        code = duty_code_from_line(line)
+        if code is None:
+            return None
+
+        tokens = line.split()
+        times = [t for t in tokens if time_pattern.fullmatch(t)]
+        if len(times) < 2:
+            return None
+
+        # everything after the sign off time is routes and school runs
+        rest = tokens[tokens.index(times[1]) + 1:]
+        school_runs = [t for t in rest if school_run_pattern.match(t)]
+        route_names = [t for t in rest if not school_run_pattern.match(t)]
+        return cls.from_parts(code, times[0], times[1], route_names, school_runs)
+
+    def route_names(self):
+        return rr.mask_to_routes(self.routes) + list(self.extra_routes)
+
+    def school_run_names(self):
+        return [f"{run:03d}n" for run in self.school_runs]
+
+    def spread(self):
+        """
+        Minutes from sign on to sign off, allowing for duties past midnight.
+        """
+        return (self.sign_off - self.sign_on) % (24 * 60)
+
+    def _key(self):
+        return (self.code, self.sign_on, self.sign_off, self.routes, tuple(self.school_runs), self.extra_routes)
+
+    def __eq__(self, other):
+        if not isinstance(other, DutyRecord):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __str__(self):
+        s = f"Duty:  {self.code}  {format_time(self.sign_on)}  {format_time(self.sign_off)}"
+        for name in self.route_names() + self.school_run_names():
+            s += " " + name
+        return s
+
+    def __repr__(self):
+        return f"DutyRecord({str(self)!r})"
+
+
+def cache_path(file_path):
+    """
+    Returns the path of the compiled index cache for a db file, e.g.
+    '10_mon_thu-db.idx' for '10_mon_thu-db.txt'.
+    """
+    return os.path.splitext(file_path)[0] + '.idx'
+
+
+def load_cached_index(file_path, st):
+    """
+    Loads the cached index of a db file if it was built from the file as it
+    is now.
+
+    Args:
+        file_path (str): The path to the db file.
+        st (os.stat_result): The current stat of the db file.
+
+    Returns:
+        dict or None: The cached index, or None if there is no cache or the
+                      db file's size or mtime no longer match it.
+    """
+    try:
+        with open(cache_path(file_path), 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+    # the route bitmasks are only meaningful for the catalogue they were built with
+    if (not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION
+            or cached.get('size') != st.st_size or cached.get('mtime_ns') != st.st_mtime_ns
+            or cached.get('routes') != rr.routes):
+        return None
+    return cached.get('index')
+
+
+def save_cached_index(file_path, st, index):
+    """
+    Writes the compiled index of a db file next to it, tagged with the db
+    file's size and mtime so a changed db file invalidates it.
+    """
+    path = cache_path(file_path)
+    tmp_path = path + '.tmp'
+    cached = {'version': CACHE_VERSION, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+              'routes': list(rr.routes), 'index': index}
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        print(f"Warning: could not write index cache '{path}': {e}")
+
+
+class DutyDatabase:
+    """
+    Holds every duty database in memory, indexed by exact duty code.
+
+    Each db file (one per day-type, e.g. '10_mon_thu-db.txt') is read once
+    into a dict of duty code -> DutyRecord, so a shift lookup is a single hash
+    probe instead of a scan of the file. Codes are matched exactly, so 'H16'
+    no longer matches the 'H164' line.
+
+    The index is also pickled to a '.idx' file next to the db file, which
+    later runs load instead of re-parsing the text. The cache is ignored and
+    rebuilt when the db file's size or mtime changes.
+    """
+
+    def __init__(self, db_files=None, use_cache=True):
+        """
+        Args:
+            db_files (list[str]): Paths of the db files to load up front.
+            use_cache (bool): Load and save the compiled index cache that
+                              sits next to each db file.
+        """
+        self.indexes = {}
+        self.use_cache = use_cache
+        for file_path in db_files or []:
+            self.load(file_path)
+
+    def load(self, file_path):
+        """
+        Loads the index for a db file, from its cache if that is still valid,
+        otherwise by reading the db file (and refreshing the cache).
+
+        Args:
+            file_path (str): The path to the db file.
+
+        Returns:
+            dict: The duty code -> DutyRecord index, or None if the file
+                  could not be read.
+        """
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            print(f"Error: File not found at '{file_path}'")
+            self.indexes[file_path] = None
+            return None
+
+        if self.use_cache:
+            index = load_cached_index(file_path, st)
+            if index is not None:
+                rp.profiler.count('index_cache_hits')
+                self.indexes[file_path] = index
+                return index
+
+        rp.profiler.count('db_file_reads')
+        index = self.read_db_file(file_path)
+        self.indexes[file_path] = index
+        if index is not None and self.use_cache:
+            save_cached_index(file_path, st, index)
+        return index
+
+    @staticmethod
+    def read_db_file(file_path):
+        """
+        Reads a db file into a duty code -> DutyRecord index.
+
+        Args:
+            file_path (str): The path to the db file.
+
+        Returns:
+            dict: The index, or None if the file could not be read.
+        """
+        index = {}
+        try:
+            with open(file_path, 'r') as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    record = DutyRecord.from_line(line)
+                    if record is None:
+                        print(f"Warning: skipping unreadable line in '{file_path}': {line.strip()}")
+                        continue
+                    # keep the first occurrence, like the old file scan did
+                    if record.code not in index:
+                        index[record.code] = record
+        except Exception as e:
+            print(f"An error occurred while reading the file: {e}")
+            return None
+
+        return index
+
+    def find(self, file_path, duty):
+        """
+        Looks up a duty in one of the loaded db files.
+
+        Drop-in replacement for rosutils.find_row_with_string, loading the
+        file on first use if it was not passed to the constructor.
+
+        Args:
+            file_path (str): The db file for the day-type being looked up.
+            duty (str): The duty code, e.g. 'H860'.
+
+        Returns:
+            DutyRecord, str or None: The duty's record, a '*** <duty> Shift not found ***'
+                                     marker if the code is not in the file, or None
+                                     if the file could not be read.
+        """
+        if file_path not in self.indexes:
+            self.load(file_path)
+
+        index = self.indexes[file_path]
+        if index is None:
+            return None
+
+        record = index.get(str(duty).strip().upper())
+        if record is None:
+            return f"*** {duty} Shift not found ***"
+        return record
+
+    def __contains__(self, file_path):
+        return self.indexes.get(file_path) is not None
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes.values() if index)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Comparison of two resolved rosters.
+"""
+
+import json
+
+import numpy as np
+
+
+class ResolvedRoster:
+    """
+    One side of a diff: the cleaned roster cells and the resolved duties of
+    every driver, as driver x day matrices of value ids.
+
+    Attributes:
+        dates (list[str]): The roster dates, 'dd-mm-yyyy'.
+        drivers (list[str]): Driver names, one per matrix row.
+        cells, duty (np.ndarray): Ids into the shared values list.
+    """
+
+    def __init__(self, dates, drivers, cells, duty, values):
+        """
+        Args:
+            dates (list[str]): The roster dates.
+            drivers (list[str]): The driver names.
+            cells, duty: One list of strings per driver, one string per day.
+            values (dict): String -> id, shared by both sides of a diff so
+                           equal strings get equal ids.
+        """
+        self.dates = list(dates)
+        self.drivers = list(drivers)
+        n_days = len(self.dates)
+        self.cells = self._ids(cells, n_days, values)
+        self.duty = self._ids(duty, n_days, values)
+
+    @staticmethod
+    def _ids(rows, n_days, values):
+        # a row ending in blank days is short; the missing days read as ''
+        ids = np.full((len(rows), n_days), values.setdefault('', len(values)), dtype=np.int32)
+        for r, row in enumerate(rows):
+            for d, value in enumerate(row[:n_days]):
+                key = '' if value is None else str(value)
+                vid = values.get(key)
+                if vid is None:
+                    vid = values[key] = len(values)
+                ids[r, d] = vid
+        return ids
+
+    @classmethod
+    def from_rosters(cls, dates, sheet, rosters, values):
+        """
+        Builds a side from a cleaned RosterSheet and its resolved rosters
+        (main.iter_driver_rosters).
+        """
+        drivers, cells, duty = [], [], []
+        for driver_name, resolved in rosters:
+            drivers.append(driver_name)
+            cells.append(sheet.row(sheet.drivers[driver_name])[sheet.n:])
+            duty.append(resolved)
+        return cls(dates, drivers, cells, duty, values)
+
+    @classmethod
+    def from_state(cls, state_file, values):
+        """
+        Builds a side from a resolved roster saved by main.py --incremental.
+        """
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+        drivers = state['drivers']
+        return cls([date_str for date_str, _ in state['days']], list(drivers),
+                   [d['cells'] for d in drivers.values()], [d['duty'] for d in drivers.values()], values)
+
+
+def diff(old, new, values):
+    """
+    Compares two resolved rosters.
+
+    Drivers are matched by name with a hash join and days by date; the cell
+    and duty matrices of the matched rows are then compared in one array
+    operation each.
+
+    Args:
+        old, new (ResolvedRoster): The two sides, built with the same values.
+        values (dict): The string -> id map they were built with.
+
+    Returns:
+        dict: 'changed' lists a dict per changed driver-day with 'driver',
+              'date', 'old' and 'new' (cell and resolved duty); 'added' and
+              'removed' list driver names; 'dates' are the compared dates.
+    """
+    names = {value: key for key, value in values.items()}
+
+    new_rows = {name: r for r, name in enumerate(new.drivers)}
+    pairs = [(r, new_rows[name]) for r, name in enumerate(old.drivers) if name in new_rows]
+    old_set = set(old.drivers)
+    added = [name for name in new.drivers if name not in old_set]
+    removed = [name for name in old.drivers if name not in new_rows]
+
+    new_cols = {date_str: c for c, date_str in enumerate(new.dates)}
+    cols = [(c, new_cols[date_str]) for c, date_str in enumerate(old.dates) if date_str in new_cols]
+
+    changed = []
+    if pairs and cols:
+        old_r, new_r = np.array(pairs).T
+        old_c, new_c = np.array(cols).T
+        a_cells, b_cells = old.cells[np.ix_(old_r, old_c)], new.cells[np.ix_(new_r, new_c)]
+        a_duty, b_duty = old.duty[np.ix_(old_r, old_c)], new.duty[np.ix_(new_r, new_c)]
+
+        for i, j in zip(*np.nonzero((a_cells != b_cells) | (a_duty != b_duty))):
+            changed.append({'driver': old.drivers[old_r[i]], 'date': old.dates[old_c[j]],
+                            'old': (names[a_cells[i, j]], names[a_duty[i, j]]),
+                            'new': (names[b_cells[i, j]], names[b_duty[i, j]])})
+
+    return {'changed': changed, 'added': added, 'removed': removed,
+            'dates': [old.dates[c] for c, _ in cols]}
+
+
+def print_diff(result, old_name, new_name, file=None):
+    """
+    Prints the result of diff.
+    """
+    print(f"--- {old_name}", file=file)
+    print(f"+++ {new_name}", file=file)
+    if result['dates']:
+        print(f"{len(result['dates'])} day(s) compared, {result['dates'][0]} to {result['dates'][-1]}", file=file)
+    else:
+        print("The rosters have no dates in common", file=file)
+    for name in result['removed']:
+        print(f"- {name}", file=file)
+    for name in result['added']:
+        print(f"+ {name}", file=file)
+    for c in result['changed']:
+        print(f"| {c['driver']:<24} | {c['date']} | {c['old'][1] or c['old'][0]} -> {c['new'][1] or c['new'][0]}",
+              file=file)
+    print(f"{len(result['changed'])} changed day(s), {len(result['added'])} driver(s) added, "
+          f"{len(result['removed'])} removed", file=file)
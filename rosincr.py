@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental re-resolution of a roster against saved state.
+"""
+
+import hashlib
+import json
+import os
+
+import rosprof as rp
+
+STATE_VERSION = 1
+
+
+def fingerprint(parts):
+    """
+    Returns a short digest of a sequence of strings.
+    """
+    h = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        h.update(str(part).encode('utf-8'))
+        h.update(b'\x1f')
+    return h.hexdigest()
+
+
+def db_fingerprints(duty_db, db_files):
+    """
+    Returns db file -> {duty code -> fingerprint of its db line} for every
+    db file the roster uses.
+    """
+    fps = {}
+    for file_path in sorted(set(db_files)):
+        index = duty_db.indexes.get(file_path) or {}
+        fps[file_path] = {code: fingerprint([record]) for code, record in index.items()}
+    return fps
+
+
+def changed_codes(old, new):
+    """
+    Returns db file -> set of the duty codes added, removed or changed
+    between two db_fingerprints results.
+    """
+    changed = {}
+    for file_path in set(old) | set(new):
+        a, b = old.get(file_path, {}), new.get(file_path, {})
+        changed[file_path] = {code for code in set(a) | set(b) if a.get(code) != b.get(code)}
+    return changed
+
+
+def load_state(state_file):
+    """
+    Loads a state file written by save_state, or returns None if there is
+    none or it cannot be used.
+    """
+    if not os.path.exists(state_file):
+        return None
+    try:
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring unreadable state file '{state_file}': {e}")
+        return None
+    if state.get('version') != STATE_VERSION:
+        return None
+    return state
+
+
+def save_state(state, state_file):
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+
+def update(state, roster_file, sheet, calendar, duty_db):
+    """
+    Brings a resolved roster up to date, resolving only what changed.
+
+    A cell is resolved again when its roster cell changed or when the db
+    entry of its duty was added, removed or changed; every other cell keeps
+    its stored value. Driver rows are compared by fingerprint first, so an
+    unchanged row costs one hash. A different roster file or calendar
+    starts again from scratch.
+
+    Args:
+        state (dict): The previous state from load_state, or None.
+        roster_file (str): The roster workbook.
+        sheet: The cleaned RosterSheet of the workbook.
+        calendar: Its RosterCalendar.
+        duty_db: The loaded DutyDatabase.
+
+    Returns:
+        (new_state, changes, full) where changes lists dicts with 'driver',
+        'date', 'old' and 'new' (date None for a driver added or removed)
+        for every cell whose resolved duty changed, and full is True when
+        there was no usable state and everything was resolved.
+    """
+    prof = rp.profiler
+    days = [[day.date_str, day.db_file] for day in calendar]
+    db = db_fingerprints(duty_db, calendar.day_db_files)
+
+    full = (state is None or state.get('roster_file') != os.path.basename(roster_file)
+            or state.get('days') != days)
+    if full:
+        old_drivers, changed = {}, {}
+    else:
+        old_drivers, changed = state['drivers'], changed_codes(state['db'], db)
+    db_changed = any(changed.values())
+
+    drivers = {}
+    changes = []
+    for driver_name, row in sheet.drivers.items():
+        cells = [str(cell) for cell in sheet.row(row)[sheet.n:]][:len(days)]
+        # trailing blank days are not stored in the sheet
+        cells += [''] * (len(days) - len(cells))
+        row_fp = fingerprint(cells)
+        old = old_drivers.get(driver_name)
+
+        if old is None:
+            stale = range(len(cells))
+            duty = [None] * len(cells)
+        else:
+            old_cells = old['cells']
+            duty = list(old['duty'])
+            same_row = old['row'] == row_fp
+            stale = []
+            if not same_row or db_changed:
+                for i, (date_str, db_file) in enumerate(days[:len(cells)]):
+                    cell_changed = not same_row and (i >= len(old_cells) or old_cells[i] != cells[i])
+                    if cell_changed or cells[i].strip().upper() in changed.get(db_file, ()):
+                        stale.append(i)
+            duty += [None] * (len(cells) - len(duty))
+            del duty[len(cells):]
+
+        if stale:
+            is_off = sheet.row_is_off(row)[sheet.n:]
+            for i in stale:
+                with prof.stage('match_shift'):
+                    value = cells[i] if cells[i] == '' or is_off[i] else duty_db.find(days[i][1], cells[i])
+                value = None if value is None else str(value)
+                if old is not None and value != duty[i]:
+                    changes.append({'driver': driver_name, 'date': days[i][0], 'old': duty[i], 'new': value})
+                duty[i] = value
+        prof.count('cells_resolved', len(stale))
+        prof.count('cells_reused', len(cells) - len(stale))
+
+        if old is None and not full:
+            changes.append({'driver': driver_name, 'date': None, 'old': None, 'new': 'added'})
+        drivers[driver_name] = {'row': row_fp, 'cells': cells, 'duty': duty}
+
+    for driver_name in old_drivers:
+        if driver_name not in drivers:
+            changes.append({'driver': driver_name, 'date': None, 'old': 'removed', 'new': None})
+
+    new_state = {'version': STATE_VERSION, 'roster_file': os.path.basename(roster_file),
+                 'days': days, 'db': db, 'drivers': drivers}
+    return new_state, changes, full
+
+
+def print_changes(changes, full, n_drivers, file=None):
+    """
+    Prints the result of update.
+    """
+    if full:
+        print(f"No previous state: resolved {n_drivers} drivers", file=file)
+        return
+    print(f"{len(changes)} change(s)", file=file)
+    for c in changes:
+        if c['date'] is None:
+            print(f"| {c['driver']:<24} | {c['old'] or c['new']}", file=file)
+        else:
+            print(f"| {c['driver']:<24} | {c['date']} | {c['old']} -> {c['new']}", file=file)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Reverse index of a resolved roster: who works a duty, route or school run.
+"""
+
+from datetime import date, datetime
+
+import rosdb as rdb
+
+DUTY, ROUTE, SCHOOL_RUN = 'duty', 'route', 'school_run'
+
+
+class RosterIndex:
+    """
+    Reverse index of a resolved roster: who works a duty, a route or a
+    school run on a given date.
+
+    It is filled while the roster is resolved (see collect), one driver at a
+    time, and every query is then a dict lookup. Keys are (date_str, TERM)
+    with the term upper-cased; day-off codes and shifts missing from the db
+    are indexed as duties under their roster code.
+
+    Attributes:
+        dates (list[str]): The roster dates, 'dd-mm-yyyy'.
+        by_duty, by_route, by_school_run (dict): (date_str, TERM) -> list of
+            driver names, in roster order.
+    """
+
+    def __init__(self, dates):
+        self.dates = list(dates)
+        self.by_duty = {}
+        self.by_route = {}
+        self.by_school_run = {}
+        self.drivers = 0
+
+    def add(self, driver_name, duty):
+        """
+        Indexes one driver's resolved roster.
+
+        Args:
+            driver_name (str): The driver.
+            duty (list): The resolved value for each day, as produced by
+                         main.resolve_shifts.
+        """
+        for date_str, value in zip(self.dates, duty):
+            if isinstance(value, rdb.DutyRecord):
+                self.by_duty.setdefault((date_str, value.code.upper()), []).append(driver_name)
+                for route in value.route_names():
+                    self.by_route.setdefault((date_str, route.upper()), []).append(driver_name)
+                for run in value.school_run_names():
+                    self.by_school_run.setdefault((date_str, run.upper()), []).append(driver_name)
+                continue
+
+            if value is None or value == '':
+                continue
+            code = str(value)
+            m = rdb.not_found_regex.match(code)
+            if m:
+                code = m.group(1)
+            self.by_duty.setdefault((date_str, code.upper()), []).append(driver_name)
+        self.drivers += 1
+
+    def collect(self, rosters):
+        """
+        Indexes rosters as they stream past.
+
+        Args:
+            rosters: Iterable of (driver_name, duty) tuples.
+
+        Yields:
+            The same (driver_name, duty) tuples, unchanged.
+        """
+        for driver_name, duty in rosters:
+            self.add(driver_name, duty)
+            yield driver_name, duty
+
+    @classmethod
+    def from_rosters(cls, dates, rosters):
+        index = cls(dates)
+        for driver_name, duty in rosters:
+            index.add(driver_name, duty)
+        return index
+
+    def who(self, term, date_str):
+        """
+        Finds the drivers on a duty, route or school run on a date.
+
+        Args:
+            term (str): A duty code (H166), day-off code (ADO), route (190X)
+                        or school run (761n); case is ignored.
+            date_str (str): The date, 'dd-mm-yyyy'.
+
+        Returns:
+            dict: {'duty'|'route'|'school_run': [driver names]}, only the
+                  kinds that matched.
+        """
+        key = (date_str, term.upper())
+        result = {}
+        for kind, table in ((DUTY, self.by_duty), (ROUTE, self.by_route), (SCHOOL_RUN, self.by_school_run)):
+            drivers = table.get(key)
+            if drivers:
+                result[kind] = drivers
+        return result
+
+
+def dates_on(calendar, on):
+    """
+    Works out which roster dates an --on argument means.
+
+    Args:
+        calendar: The RosterCalendar of the roster.
+        on (str): 'today', a day name ('Tuesday', 'tue'), 'dd-mm-yyyy' or
+                  'yyyy-mm-dd'.
+
+    Returns:
+        list[str]: The matching roster dates, 'dd-mm-yyyy'; empty if none
+                   fall in the roster period.
+    """
+    text = on.strip().lower()
+    if text == 'today':
+        day = date.today()
+    else:
+        day = None
+        for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
+            try:
+                day = datetime.strptime(text, fmt).date()
+                break
+            except ValueError:
+                pass
+
+    if day is not None:
+        return [d.date_str for d in calendar.days if d.date == day]
+
+    if len(text) >= 3:
+        return [d.date_str for d in calendar.days if d.day.lower().startswith(text)]
+    return []
+
+
+def print_who(index, term, dates, day_names, file=None):
+    """
+    Prints the drivers on term for each of the given dates.
+    """
+    names = dict(zip(index.dates, day_names))
+    for date_str in dates:
+        result = index.who(term, date_str)
+        if not result:
+            print(f"{date_str} {names[date_str]:<9} {term}: nobody", file=file)
+            continue
+        for kind, drivers in result.items():
+            print(f"{date_str} {names[date_str]:<9} {term} ({kind}): {'; '.join(drivers)}", file=file)
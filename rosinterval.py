@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Interval index over duty times, for cover queries.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+
+import rosdb as rdb
+
+DAY_MINUTES = 24 * 60
+
+# the day-off codes of drivers who can be called in to cover: OFF, ADO and
+# their xxx/uws variants, but not leave (A/L, LSL, OFFL, ...)
+available_regex = re.compile(r'(OFF|ADO)\d*$')
+
+
+def parse_window(text):
+    """
+    Parses a 'h:mm-h:mm' time window.
+
+    Returns:
+        (start, end): Minutes since midnight; end is pushed past midnight
+                      when the window wraps, e.g. '22:00-1:30'.
+
+    Raises:
+        ValueError: If text is not a time window.
+    """
+    parts = text.split('-')
+    if len(parts) != 2:
+        raise ValueError(f"'{text}' is not a time window, expected h:mm-h:mm")
+    start, end = rdb.parse_time(parts[0]), rdb.parse_time(parts[1])
+    if start is None or end is None:
+        raise ValueError(f"'{text}' is not a time window, expected h:mm-h:mm")
+    if end <= start:
+        end += DAY_MINUTES
+    return start, end
+
+
+def duty_interval(record):
+    """
+    Returns the half-open [sign on, sign off) interval of a duty in minutes,
+    with sign off past midnight for late duties.
+    """
+    return record.sign_on, record.sign_on + record.spread()
+
+
+class _Node:
+    __slots__ = ('center', 'left', 'right', 'starts', 'by_start', 'ends', 'by_end')
+
+    def __init__(self, items):
+        points = sorted(p for on, off, _ in items for p in (on, off))
+        # the lower median: every interval is non-empty, so at least one
+        # holds it or lies right of it and the recursion always shrinks
+        self.center = points[(len(points) - 1) // 2]
+
+        here, left, right = [], [], []
+        for item in items:
+            on, off, _ = item
+            if off <= self.center:
+                left.append(item)
+            elif on > self.center:
+                right.append(item)
+            else:
+                here.append(item)
+
+        # the intervals at a node all hold the center, sorted both ways
+        self.by_start = sorted(here, key=lambda item: item[0])
+        self.starts = [item[0] for item in self.by_start]
+        self.by_end = sorted(here, key=lambda item: -item[1])
+        self.ends = [-item[1] for item in self.by_end]
+        self.left = _Node(left) if left else None
+        self.right = _Node(right) if right else None
+
+
+class IntervalIndex:
+    """
+    Centered interval tree over the duties of one db file.
+
+    stabbing(t) and overlapping(start, end) run in O(log n + k) for k
+    results: the intervals overlapping a window are those holding its start
+    (a stabbing query down the tree) plus those starting inside it (a range
+    of the sorted start times). within(start, end) uses the sorted start
+    times too and then checks the sign off of each candidate.
+    """
+
+    def __init__(self, records):
+        """
+        Args:
+            records: Iterable of DutyRecord.
+        """
+        items = [duty_interval(record) + (record,) for record in records]
+        # a duty signing off when it signs on is never worked, so it is left
+        # out of the tree and of the sorted starts alike
+        worked = [item for item in items if item[1] > item[0]]
+        self.root = _Node(worked) if worked else None
+        worked.sort(key=lambda item: item[0])
+        self.items = worked
+        self.starts = [item[0] for item in worked]
+
+    def __len__(self):
+        return len(self.items)
+
+    def stabbing(self, t):
+        """
+        Returns the duties on at minute t.
+        """
+        found = []
+        node = self.root
+        while node is not None:
+            if t < node.center:
+                found.extend(node.by_start[:bisect_right(node.starts, t)])
+                node = node.left
+            else:
+                found.extend(node.by_end[:bisect_left(node.ends, -t)])
+                node = node.right
+        return found
+
+    def overlapping(self, start, end):
+        """
+        Returns the duties worked at any time in [start, end), ordered by
+        sign on.
+        """
+        found = self.stabbing(start)
+        found.extend(self.items[bisect_right(self.starts, start):bisect_left(self.starts, end)])
+        found.sort(key=lambda item: item[0])
+        return [item[2] for item in found]
+
+    def within(self, start, end):
+        """
+        Returns the duties that sign on and off inside [start, end], ordered
+        by sign on.
+        """
+        lo, hi = bisect_left(self.starts, start), bisect_right(self.starts, end)
+        return [item[2] for item in self.items[lo:hi] if item[1] <= end]
+
+
+def build_interval_indexes(duty_db):
+    """
+    Builds an IntervalIndex for every loaded db file.
+
+    Returns:
+        dict: db file path -> IntervalIndex.
+    """
+    return {file_path: IntervalIndex(index.values())
+            for file_path, index in duty_db.indexes.items() if index is not None}
+
+
+def cover(calendar, roster_index, intervals, start, end, dates, daysoff, within=False):
+    """
+    Lists who could cover a time window: the duties worked in it with the
+    drivers rostered on them, and the drivers rostered OFF or ADO that day.
+
+    Args:
+        calendar: The RosterCalendar of the roster.
+        roster_index: The rosindex.RosterIndex of the resolved roster.
+        intervals (dict): db file path -> IntervalIndex.
+        start, end (int): The window, minutes since midnight.
+        dates (list[str]): The dates to look at, 'dd-mm-yyyy'.
+        daysoff (list[str]): The day-off codes.
+        within (bool): Only duties inside the window instead of every duty
+                       overlapping it.
+
+    Returns:
+        list[dict]: One entry per date with 'date', 'day', 'duties' as
+                    (DutyRecord, [drivers]) and 'available' drivers.
+    """
+    off_codes = [code.upper() for code in daysoff if available_regex.search(code)]
+    days = {day.date_str: day for day in calendar}
+
+    result = []
+    for date_str in dates:
+        day = days[date_str]
+        index = intervals.get(day.db_file)
+        records = []
+        if index is not None:
+            records = index.within(start, end) if within else index.overlapping(start, end)
+
+        duties = [(record, roster_index.by_duty.get((date_str, record.code.upper()), [])) for record in records]
+        available = [driver for code in off_codes for driver in roster_index.by_duty.get((date_str, code), [])]
+        result.append({'date': date_str, 'day': day.day, 'duties': duties, 'available': available})
+    return result
+
+
+def print_cover(result, start, end, file=None):
+    """
+    Prints the result of cover.
+    """
+    window = f"{rdb.format_time(start % DAY_MINUTES)}-{rdb.format_time(end % DAY_MINUTES)}"
+    for entry in result:
+        print(f"{entry['date']} {entry['day']:<9} {window}", file=file)
+        for record, drivers in entry['duties']:
+            print(f"  {record}  : {'; '.join(drivers) if drivers else 'not rostered'}", file=file)
+        print(f"  Available: {'; '.join(entry['available']) if entry['available'] else 'nobody'}", file=file)
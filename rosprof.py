@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Per-stage timings and counters for --profile.
+"""
+
+import contextlib
+import json
+import time
+
+
+class Profiler:
+    """
+    Collects wall time and call counts per pipeline stage, plus plain event
+    counters (db file reads, cache hits, ...).
+
+    It is off by default and then costs next to nothing: stage() hands back
+    a shared no-op context manager and count() returns straight away.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.times = {}
+        self.calls = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+        self.started = time.perf_counter()
+
+    def stage(self, name):
+        """
+        Times a block of code under a stage name:
+
+            with profiler.stage('read_excel'):
+                df = pd.read_excel(file)
+        """
+        if not self.enabled:
+            return _null_stage
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0.0) + time.perf_counter() - t0
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, n=1):
+        """
+        Adds n to an event counter.
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        """
+        Drops everything collected so far, keeping the enabled flag.
+        """
+        self.times = {}
+        self.calls = {}
+        self.counters = {}
+        self.started = time.perf_counter()
+
+    def merge(self, summary):
+        """
+        Adds the stages and counters of another profiler's summary, e.g. one
+        sent back from a worker process. Stages that ran in parallel add up,
+        so their seconds can exceed the total wall time.
+        """
+        if not self.enabled or not summary:
+            return
+        for name, stage in summary['stages'].items():
+            self.times[name] = self.times.get(name, 0.0) + stage['seconds']
+            self.calls[name] = self.calls.get(name, 0) + stage['calls']
+        for name, value in summary['counters'].items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        """
+        Returns the collected metrics as a dict, stages in the order they
+        first ran.
+        """
+        stages = {name: {'seconds': self.times[name], 'calls': self.calls[name]} for name in self.times}
+        return {'total_seconds': time.perf_counter() - self.started,
+                'stages': stages,
+                'counters': dict(self.counters)}
+
+    def report(self, logger, json_file=None):
+        """
+        Logs the summary and optionally writes it to a JSON metrics file.
+        """
+        summary = self.summary()
+        logger.info(f"Profile: total {summary['total_seconds']:.6f} s")
+        for name, stage in summary['stages'].items():
+            logger.info(f"Profile: {name:<16} {stage['seconds']:.6f} s  {stage['calls']} call(s)")
+        for name, value in summary['counters'].items():
+            logger.info(f"Profile: {name:<16} {value}")
+
+        if json_file:
+            with open(json_file, 'w') as f:
+                json.dump(summary, f, indent=4)
+        return summary
+
+
+_null_stage = contextlib.nullcontext()
+
+# the profiler shared by every module of a run
+profiler = Profiler()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming renderers for roster output: text, CSV, JSON Lines and HTML.
+"""
+
+import csv
+import html
+import json
+import sys
+
+import rosdb as rdb
+
+OUTPUT_BUFFER = 1 << 16
+
+
+def pad_str_whitespace(str, max):
+    white_space = ' '
+    str_len = len(str)
+    pad = max - str_len
+    return str + white_space * pad
+
+
+def duty_fields(value):
+    """
+    Splits a resolved roster cell into output fields.
+
+    Args:
+        value: A DutyRecord, a day-off code, a '*** ... Shift not found ***'
+               marker or None.
+
+    Returns:
+        dict: code, sign_on, sign_off, routes, school_runs and the display text.
+    """
+    if isinstance(value, rdb.DutyRecord):
+        return {'code': value.code,
+                'sign_on': rdb.format_time(value.sign_on),
+                'sign_off': rdb.format_time(value.sign_off),
+                'routes': value.route_names(),
+                'school_runs': value.school_run_names(),
+                'text': str(value)}
+    text = '' if value is None else str(value)
+    return {'code': text, 'sign_on': '', 'sign_off': '', 'routes': [], 'school_runs': [], 'text': text}
+
+
+class Renderer:
+    """
+    Writes resolved rosters to an output stream one driver at a time, so the
+    output of a whole depot is never held in memory.
+
+    Usage:
+        renderer.begin()
+        renderer.driver(driver_name, dates, days, duty)   # once per driver
+        renderer.end()
+    """
+
+    def __init__(self, out):
+        """
+        Args:
+            out: A text file object to write to.
+        """
+        self.out = out
+
+    def begin(self):
+        pass
+
+    def driver(self, driver_name, dates, days, duty):
+        raise NotImplementedError
+
+    def end(self):
+        self.out.flush()
+
+
+class TextRenderer(Renderer):
+    """
+    The boxed text table pretty_print has always printed.
+    """
+
+    def driver(self, driver_name, dates, days, duty):
+        #create print strings
+        print_strs = [f'| {date_str} | {day:<9} | {res} ' for date_str, day, res in zip(dates, days, duty)]
+
+        #set min pad width
+        print_str_length = max([63] + [len(s) for s in print_strs])
+
+        #pad each string with whitespace out to max string length
+        dash = '-' * (print_str_length + 1)
+
+        lines = [dash,
+                 pad_str_whitespace(f'| Driver:            {driver_name}', print_str_length) + '|',
+                 pad_str_whitespace(f'| Roster start date: {dates[0]:}', print_str_length) + '|',
+                 dash,
+                 pad_str_whitespace('|   Date     |   Day     |     Duty     Sign in/out    Run(s) ', print_str_length) + '|',
+                 dash]
+        lines += [pad_str_whitespace(s, print_str_length) + '|' for s in print_strs]
+        lines.append(dash)
+
+        # one write per driver
+        self.out.write('\n'.join(lines) + '\n')
+
+
+class CsvRenderer(Renderer):
+    """
+    One CSV row per driver per day.
+    """
+
+    columns = ['driver', 'roster_start', 'date', 'day', 'code', 'sign_on', 'sign_off', 'routes', 'school_runs']
+
+    def begin(self):
+        self.writer = csv.writer(self.out)
+        self.writer.writerow(self.columns)
+
+    def driver(self, driver_name, dates, days, duty):
+        rows = []
+        for date_str, day, res in zip(dates, days, duty):
+            f = duty_fields(res)
+            rows.append([driver_name, dates[0], date_str, day, f['code'], f['sign_on'], f['sign_off'],
+                         ' '.join(f['routes']), ' '.join(f['school_runs'])])
+        self.writer.writerows(rows)
+
+
+class JsonLinesRenderer(Renderer):
+    """
+    One JSON object per driver per line.
+    """
+
+    def driver(self, driver_name, dates, days, duty):
+        record = {'driver': driver_name, 'roster_start': dates[0], 'days': []}
+        for date_str, day, res in zip(dates, days, duty):
+            f = duty_fields(res)
+            del f['text']
+            record['days'].append(dict(date=date_str, day=day, **f))
+        self.out.write(json.dumps(record) + '\n')
+
+
+class HtmlRenderer(Renderer):
+    """
+    A static HTML page with one table per driver.
+    """
+
+    def begin(self):
+        self.out.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>Roster</title>\n'
+                       '<style>table{border-collapse:collapse;margin-bottom:1.5em}'
+                       'th,td{border:1px solid #999;padding:2px 6px;text-align:left}'
+                       'tr.off td{color:#777}</style>\n</head>\n<body>\n')
+
+    def driver(self, driver_name, dates, days, duty):
+        e = html.escape
+        rows = [f'<h2>{e(driver_name)}</h2>\n<p>Roster start date: {e(dates[0])}</p>\n<table>\n'
+                '<tr><th>Date</th><th>Day</th><th>Duty</th><th>Sign on</th><th>Sign off</th><th>Run(s)</th></tr>\n']
+        for date_str, day, res in zip(dates, days, duty):
+            f = duty_fields(res)
+            cls = '' if isinstance(res, rdb.DutyRecord) else ' class="off"'
+            rows.append(f'<tr{cls}><td>{e(date_str)}</td><td>{e(day)}</td><td>{e(f["code"])}</td>'
+                        f'<td>{f["sign_on"]}</td><td>{f["sign_off"]}</td>'
+                        f'<td>{e(" ".join(f["routes"] + f["school_runs"]))}</td></tr>\n')
+        rows.append('</table>\n')
+        self.out.write(''.join(rows))
+
+    def end(self):
+        self.out.write('</body>\n</html>\n')
+        super().end()
+
+
+RENDERERS = {'text': TextRenderer, 'csv': CsvRenderer, 'jsonl': JsonLinesRenderer, 'html': HtmlRenderer}
+
+
+def open_output(file_path=None):
+    """
+    Opens the output stream: stdout for None or '-', otherwise the file,
+    through one large write buffer.
+    """
+    if file_path in (None, '-'):
+        return sys.stdout
+    return open(file_path, 'w', buffering=OUTPUT_BUFFER, newline='', encoding='utf-8')
@@ -5,9 +5,99 @@ Created on Wed Jun 25 22:34:39 2025
 @author: david
 """
 import re
+import functools
+import mmap
 
 routes = ['199', '185', '182', '191', '192', '155', 'B1', '156', '190X', '181X']
 
+def routes_to_mask(names: list[str]) -> int:
+    """
+    Packs route names into a bitmask, bit i standing for routes[i]. Names not
+    in routes are ignored.
+    """
+    rank = get_route_matcher(routes).rank
+    mask = 0
+    for name in names:
+        if name in rank:
+            mask |= 1 << rank[name]
+    return mask
+
+def mask_to_routes(mask: int) -> list[str]:
+    """
+    Unpacks a route bitmask made by routes_to_mask, in routes order.
+    """
+    return [route for i, route in enumerate(routes) if mask >> i & 1]
+
+# A token is a run of word characters that does not touch another word
+# character or a colon, so 'B1' does not match inside 'B12' and '199' does
+# not match inside a time like '19:9' or a run number like '1199'.
+# School runs are tokens of exactly three digits and an 'n', e.g. '790n'.
+token_pattern = re.compile(r'(?<![\w:])(?:(\d{3}n)|(\w+))(?![\w:])')
+word_pattern = re.compile(r'\w+')
+
+
+class RouteMatcher:
+    """
+    Finds base routes and school runs in a journal block in one scan.
+
+    The block is tokenised once with a single compiled pattern and each
+    token is checked against a hash set of the route catalogue, so the cost
+    depends on the length of the block and not on how many routes the
+    catalogue holds. Routes that are not plain word tokens (e.g. 'M30/L90')
+    are matched with one extra compiled alternation.
+    """
+
+    def __init__(self, search_list: list[str]):
+        """
+        Args:
+            search_list: The route catalogue, in the order results are reported.
+        """
+        self.rank = {}
+        for route in search_list:
+            self.rank.setdefault(route, len(self.rank))
+
+        others = sorted((r for r in self.rank if not word_pattern.fullmatch(r)), key=len, reverse=True)
+        self.other_pattern = None
+        if others:
+            self.other_pattern = re.compile(r'(?<![\w:])(?:' + '|'.join(map(re.escape, others)) + r')(?![\w:])')
+
+    def scan(self, main_string: str) -> tuple[list[str], list[str]]:
+        """
+        Scans a string for base routes and school runs.
+
+        Args:
+            main_string: The string to search within.
+
+        Returns:
+            A tuple (routes, school_runs): the base routes found, once each and
+            in catalogue order, and the school runs in the order they occur.
+        """
+        school_runs = []
+        found = set()
+        for school_run, token in token_pattern.findall(main_string):
+            if school_run:
+                school_runs.append(school_run)
+            elif token in self.rank:
+                found.add(token)
+
+        if self.other_pattern is not None:
+            found.update(self.other_pattern.findall(main_string))
+
+        return sorted(found, key=self.rank.__getitem__), school_runs
+
+
+@functools.lru_cache(maxsize=16)
+def _get_matcher(search_list: tuple) -> RouteMatcher:
+    return RouteMatcher(search_list)
+
+
+def get_route_matcher(search_list: list[str]) -> RouteMatcher:
+    """
+    Returns a RouteMatcher for a route catalogue, compiling it only once.
+    """
+    return _get_matcher(tuple(search_list))
+
+
 def find_base_runs(main_string: str, search_list: list[str]) -> list[str]:
     """
     Searches a main string for the presence of each string in a given list.
@@ -17,65 +107,85 @@ def find_base_runs(main_string: str, search_list: list[str]) -> list[str]:
         search_list: A list of strings to search for.
 
     Returns:
-        A list of booleans, where each boolean corresponds to a string in the
-        search_list. True indicates that the string was found as a substring
-        in the main_string, and False indicates it was not found.
+        A list of the strings in search_list that occur in main_string as a
+        whole token, in search_list order.
     """
-    results = []
-    for search_term in search_list:
-        # The 'in' operator checks if a substring is present within a string.
-        is_found = search_term in main_string
-        if (is_found):
-            results.append(search_term)
-            
-#TODO
-
-    return results
+    return get_route_matcher(search_list).scan(main_string)[0]
        
 
-def extract_text_blocks_from_file(file_path):
+@functools.lru_cache(maxsize=None)
+def get_delimiter_pattern(delimiter: str):
   """
-  Searches a text file for blocks of text delimited by "Depot: MONA VALE BUS DEPOT".
-  Each block starts with this string and includes all content until the next occurrence
-  of the delimiter or the end of the file.
+  Returns the compiled bytes pattern matching a delimiter at the start of a
+  line, after any leading whitespace str.strip() would drop: a Word text
+  export puts a form feed in front of the line at every page break. A lone
+  carriage return ends a line too, as it does for a file read in text mode.
+  """
+  return re.compile(rb'(?:^|(?<=\r))[ \t\f\v\r]*' + re.escape(delimiter.encode('utf-8')), re.M)
+
+
+def iter_text_blocks(file_path, delimiter="Depot:  MONA VALE BUS DEPOT"):
+  """
+  Memory-maps a text file and yields the blocks of text delimited by
+  "Depot:  MONA VALE BUS DEPOT", one at a time.
+
+  Each block starts with the delimiter line and includes all content until
+  the next occurrence of the delimiter or the end of the file. The
+  delimiters are found with one compiled regex over the mapped bytes, so
+  only the block being handed out is ever decoded into a string.
 
   Args:
     file_path (str): The path to the .txt file to search.
+    delimiter (str): The text that starts each block.
 
-  Returns:
-    list: A list of strings, where each string is a block of text found.
-          Returns an empty list if the file is not found or no blocks are found.
+  Yields:
+    str: The text of each block, stripped of surrounding whitespace.
   """
-  blocks = []
-  delimiter = "Depot:  MONA VALE BUS DEPOT"
-  current_block = []
-  in_block = False
+  pattern = get_delimiter_pattern(delimiter)
 
   try:
-    with open(file_path, 'r') as f:
-      for line in f:
-        # Check if the current line starts a new block
-        if line.strip().startswith(delimiter):
-          # If we were already collecting a block, save it
-          if in_block:
-            blocks.append("".join(current_block).strip())
-            current_block = [] # Reset for the new block
-          in_block = True
-          current_block.append(line) # Add the delimiter line to the new block
-        elif in_block:
-          # If inside a block, append the line
-          current_block.append(line)
-
-      # After the loop, if we were still collecting a block, add the last one
-      if in_block and current_block:
-        blocks.append("".join(current_block).strip())
+    with open(file_path, 'rb') as f:
+      try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      except ValueError:
+        # an empty file cannot be mapped and has no blocks
+        return
+
+      with mm:
+        start = None
+        for m in pattern.finditer(mm):
+          if start is not None:
+            yield decode_block(mm[start:m.start()])
+          start = m.start()
+
+        # the last block runs to the end of the file
+        if start is not None:
+          yield decode_block(mm[start:])
 
   except FileNotFoundError:
     print(f"Error: The file '{file_path}' was not found.")
   except Exception as e:
     print(f"An unexpected error occurred while reading the file: {e}")
 
-  return blocks
+
+def decode_block(data: bytes) -> str:
+  return data.decode('utf-8', errors='replace').replace('\r\n', '\n').strip()
+
+
+def extract_text_blocks_from_file(file_path):
+  """
+  Searches a text file for blocks of text delimited by "Depot: MONA VALE BUS DEPOT".
+  Each block starts with this string and includes all content until the next occurrence
+  of the delimiter or the end of the file.
+
+  Args:
+    file_path (str): The path to the .txt file to search.
+
+  Returns:
+    list: A list of strings, where each string is a block of text found.
+          Returns an empty list if the file is not found or no blocks are found.
+  """
+  return list(iter_text_blocks(file_path))
 
 def find_school_runs(main_string: str) -> list[str]:
     """
@@ -88,22 +198,18 @@ def find_school_runs(main_string: str) -> list[str]:
         A list of strings, where each string is a found match of the pattern.
         Returns an empty list if no matches are found.
     """
-    # The regular expression pattern:
-    # \d{3} : Matches exactly three digit characters (0-9).
-    # n     : Matches the literal character 'n'.
-    pattern = r'\d{3}n'
-    # re.findall() returns a list of all non-overlapping matches of the pattern in the string.
-    matches = re.findall(pattern, main_string)
-    return matches
+    # token_pattern's first group is \d{3}n : exactly three digit characters
+    # (0-9) followed by the literal character 'n', as a whole token.
+    return [school_run for school_run, _ in token_pattern.findall(main_string) if school_run]
 
 
 def create_routes_list(filename):
     print(f"--- Extracting blocks from '{filename}' ---")
     mona_vale_blocks_1 = extract_text_blocks_from_file(filename)    
+    matcher = get_route_matcher(routes)
     r = []
     for block in mona_vale_blocks_1:
-        res = find_base_runs(block, routes)
-        sch = find_school_runs(block)
+        res, sch = matcher.scan(block)
         r.append(res + sch)
     return r
 
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Long-running service answering roster queries from memory.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit, parse_qs
+
+from loguru import logger
+
+import rosindex as rix
+
+# everything a query reads, replaced as a whole on reload
+RosterState = namedtuple('RosterState', ['calendar', 'sheet', 'rosters', 'index', 'row_names', 'loaded_at'])
+
+
+class RosterService:
+    """
+    Keeps a resolved depot roster in memory and answers queries against it.
+
+    The loader does the slow work (reading config.json, the workbook and the
+    duty databases, resolving every driver) and returns the calendar, the
+    cleaned sheet and the resolved rosters. Queries are then dict lookups.
+    The watched files are polled and the data reloaded when any of them
+    changes.
+
+    All the loaded data sits in one immutable RosterState. A reload builds a
+    new one and swaps the reference, and every query reads self.state once,
+    so it answers from a single load even while a reload runs in a thread.
+    """
+
+    def __init__(self, loader, watch_files):
+        """
+        Args:
+            loader: Callable returning (calendar, sheet, rosters), where rosters
+                    maps driver name -> resolved duty for each day.
+            watch_files (list[str]): Files whose change triggers a reload.
+        """
+        self.loader = loader
+        self.watch_files = watch_files
+        self.stamps = None
+        self.state = None
+        self.reload()
+
+    def file_stamps(self):
+        stamps = []
+        for file_path in self.watch_files:
+            try:
+                st = os.stat(file_path)
+                stamps.append((st.st_size, st.st_mtime_ns))
+            except OSError:
+                stamps.append(None)
+        return stamps
+
+    def changed(self):
+        return self.file_stamps() != self.stamps
+
+    def reload(self):
+        """
+        Loads the data and rebuilds the lookup tables, swapping them in with
+        a single assignment once they are complete so queries never see half
+        a reload.
+        """
+        stamps = self.file_stamps()
+        calendar, sheet, rosters = self.loader()
+
+        index = rix.RosterIndex.from_rosters(calendar.dates, rosters.items())
+        row_names = {row: name for name, row in sheet.drivers.items()}
+
+        self.state = RosterState(calendar, sheet, rosters, index, row_names, time.time())
+        self.stamps = stamps
+        logger.info(f'Loaded {len(rosters)} drivers, roster start {calendar.start_date}')
+
+    @staticmethod
+    def find_driver(state, search_term):
+        rows = state.sheet.find_rows(search_term)
+        return [state.row_names[row] for row in rows if row in state.row_names]
+
+    def roster(self, search_term):
+        """
+        Returns the resolved roster of every driver matching search_term.
+        """
+        state = self.state
+        calendar = state.calendar
+        result = []
+        for driver_name in self.find_driver(state, search_term):
+            days = [{'date': date_str, 'day': day, 'duty': str(duty)}
+                    for date_str, day, duty in zip(calendar.dates, calendar.day_names, state.rosters[driver_name])]
+            result.append({'driver': driver_name, 'days': days})
+        return result
+
+    def who(self, duty, date_str):
+        """
+        Returns the drivers rostered on a duty (or day-off code) on a date.
+        """
+        return self.state.index.by_duty.get((date_str, duty.upper()), [])
+
+    def health(self):
+        state = self.state
+        return {'drivers': len(state.rosters), 'roster_start': state.calendar.dates[0],
+                'loaded_at': state.loaded_at}
+
+    def handle(self, path, params):
+        """
+        Answers one request.
+
+        Args:
+            path (str): The request path.
+            params (dict): The query string parameters.
+
+        Returns:
+            tuple: (HTTP status, JSON-serialisable body).
+        """
+        if path == '/roster':
+            if 'driver' not in params:
+                return 400, {'error': 'missing driver'}
+            result = self.roster(params['driver'])
+            if not result:
+                return 404, {'error': f"driver {params['driver']} not found"}
+            return 200, result
+
+        if path == '/duty':
+            if 'code' not in params or 'date' not in params:
+                return 400, {'error': 'missing code or date'}
+            return 200, {'code': params['code'], 'date': params['date'],
+                         'drivers': self.who(params['code'], params['date'])}
+
+        if path == '/who':
+            if 'term' not in params:
+                return 400, {'error': 'missing term'}
+            state = self.state
+            dates = rix.dates_on(state.calendar, params.get('on', 'today'))
+            return 200, {'term': params['term'],
+                         'dates': {date_str: state.index.who(params['term'], date_str) for date_str in dates}}
+
+        if path == '/health':
+            return 200, self.health()
+
+        return 404, {'error': f'unknown path {path}'}
+
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               408: 'Request Timeout', 500: 'Internal Server Error'}
+
+# seconds a client gets to send its request line and headers
+REQUEST_TIMEOUT = 10.0
+
+
+async def read_request(reader):
+    """
+    Reads the request line and skips the headers, the query string carries
+    everything we need.
+    """
+    request_line = await reader.readline()
+    if request_line.strip():
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+    return request_line
+
+
+async def handle_connection(service, reader, writer):
+    """
+    Serves one HTTP/1.1 GET request with a JSON response and closes the
+    connection. A client that does not send its request within
+    REQUEST_TIMEOUT gets a 408; a request that cannot be parsed a 400, and
+    any other failure a 500.
+    """
+    try:
+        try:
+            request_line = await asyncio.wait_for(read_request(reader), REQUEST_TIMEOUT)
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                raise ValueError('malformed request line')
+            url = urlsplit(parts[1])
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        except asyncio.TimeoutError:
+            status, body = 408, {'error': 'request timed out'}
+        except ValueError as e:
+            # also raised by readline for a line over the stream limit
+            status, body = 400, {'error': f'bad request: {e}'}
+        else:
+            if parts[0] != 'GET':
+                status, body = 405, {'error': 'only GET is supported'}
+            else:
+                try:
+                    status, body = service.handle(url.path, params)
+                except Exception as e:
+                    logger.exception(f'Request {parts[1]} failed')
+                    status, body = 500, {'error': f'internal error: {e}'}
+
+        payload = json.dumps(body).encode('utf-8')
+        writer.write(f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(payload)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode('latin-1') + payload)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def watch(service, interval):
+    """
+    Polls the watched files and reloads the service when one changes. The
+    reload runs in a worker thread so requests keep being answered from the
+    old data meanwhile.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        if service.changed():
+            logger.info('Roster data changed, reloading...')
+            try:
+                await loop.run_in_executor(None, service.reload)
+            except Exception as e:
+                logger.error(f'Reload failed, keeping previous data: {e}')
+
+
+async def serve_forever(service, host, port, interval):
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    logger.info(f'Serving roster queries on http://{host}:{port}')
+    async with server:
+        await asyncio.gather(server.serve_forever(), watch(service, interval))
+
+
+def serve(service, host='127.0.0.1', port=8080, interval=2.0):
+    """
+    Runs the HTTP/JSON query service until interrupted.
+
+    Endpoints:
+        GET /roster?driver=NAME          resolved roster for matching drivers
+        GET /duty?code=H166&date=DD-MM-YYYY  drivers on that duty that day
+        GET /who?term=190X&on=Tuesday    drivers on a duty, route or school run
+        GET /health                      what is loaded and when
+    """
+    try:
+        asyncio.run(serve_forever(service, host, port, interval))
+    except KeyboardInterrupt:
+        pass
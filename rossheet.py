@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Cleaned roster sheet and its on-disk snapshot.
+"""
+
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+import rosutils as ru
+import rosxl as rx
+
+duty_code_regex = rx.duty_code_regex
+
+SNAPSHOT_DIR = '.roster_cache'
+# bump when the arrays saved in a snapshot change
+SNAPSHOT_VERSION = 2
+SNAPSHOT_ARRAYS = ('codes', 'categories', 'rows', 'pos', 'offsets')
+
+
+class RosterSheet:
+    """
+    A roster spreadsheet cleaned in one vectorized pass.
+
+    The cells of the whole sheet are kept in one flat, row-major categorical
+    Series, so cleaning is a handful of array operations over the whole
+    sheet instead of a Python loop per cell. Each row runs from its first
+    to its last non-empty cell; blank cells in between are kept as '' so
+    every day stays in its own column.
+
+    Attributes:
+        cells (pd.Series): Cleaned cell text (categorical), row after row.
+        rows (np.ndarray): Sheet row of each cell.
+        pos (np.ndarray): Position of each cell in its cleaned row, counted
+            from the row's first non-empty cell.
+        is_off (np.ndarray): True where the cell is a day-off code.
+        offsets (np.ndarray): Start of each sheet row in ``cells``.
+        drivers (dict): Driver name -> sheet row for every driver row, in
+            sheet order; repeated names are numbered so each row is kept.
+    """
+
+    def __init__(self, df: pd.DataFrame, daysoff: list, n: int, n_days: int):
+        """
+        Args:
+            df: The roster sheet as read by pd.read_excel.
+            daysoff: The day-off codes.
+            n: Number of leading cells (name, line, ...) before the first day.
+            n_days: Number of days in the roster period.
+        """
+        values = df.to_numpy(dtype=object)
+        mask = pd.notna(values)
+
+        # keep each row from its first to its last non-empty cell, so a
+        # blank Line, Grade or day cell does not move the later days onto
+        # the wrong date; only the blanks around the row are dropped
+        n_cols = values.shape[1]
+        has_cells = mask.any(axis=1)
+        first = np.argmax(mask, axis=1)
+        last = n_cols - 1 - np.argmax(mask[:, ::-1], axis=1)
+        col = np.arange(n_cols)
+        keep = (col >= first[:, None]) & (col <= last[:, None]) & has_cells[:, None]
+
+        # boolean indexing a 2-D array flattens row by row
+        self.rows, cols = np.nonzero(keep)
+        counts = keep.sum(axis=1)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.pos = cols - first[self.rows]
+        kept = values[keep]
+        kept[~mask[keep]] = ''
+
+        # a roster repeats the same few hundred codes over and over, so the
+        # string work is done once per distinct value and mapped back
+        codes, uniques = pd.factorize(kept)
+        uniques = pd.Series(uniques, dtype=object).astype(str).astype(object)
+        stripped = uniques.str.replace('\n', '', regex=False)
+
+        # duty codes such as 'H860B1' are cut back to 4 characters; the
+        # name in position 0 is left alone so 'HARRIS' stays 'HARRIS'
+        duty_like = uniques.str[:1].isin(['D', 'H'])
+        truncated = uniques.where(~duty_like, uniques.str[:4]).str.replace('\n', '', regex=False)
+
+        labels = np.concatenate((truncated.to_numpy(), stripped.to_numpy()))
+        label_codes, categories = pd.factorize(labels)
+        codes = label_codes[np.where(self.pos > 0, codes, codes + len(uniques))]
+        self._setup(codes, categories, daysoff, n, n_days)
+
+    @classmethod
+    def from_arrays(cls, codes, categories, rows, pos, offsets, daysoff, n, n_days):
+        """
+        Builds a sheet from already cleaned arrays, as saved by save_snapshot.
+        """
+        sheet = cls.__new__(cls)
+        sheet.rows, sheet.pos, sheet.offsets = rows, pos, offsets
+        sheet._setup(codes, categories, daysoff, n, n_days)
+        return sheet
+
+    def _setup(self, codes, categories, daysoff, n, n_days):
+        self.cells = pd.Series(pd.Categorical.from_codes(codes, categories))
+        self.is_off = pd.Index(categories).isin(daysoff)[codes]
+        self.n = n
+        self.n_days = n_days
+        self.drivers = self._index_drivers(np.diff(self.offsets))
+
+    def _index_drivers(self, counts):
+        """
+        Finds the driver rows: a name followed by day cells, most of which
+        are duty or day-off codes. Title and header rows do not qualify.
+        """
+        in_days = (self.pos >= self.n) & (self.pos < self.n + self.n_days)
+        is_duty = pd.Series(self.cells.cat.categories).str.match(duty_code_regex).to_numpy()
+        known = in_days & (self.is_off | is_duty[self.cells.cat.codes.to_numpy()])
+        known_per_row = np.bincount(self.rows[known], minlength=len(counts))
+
+        driver_rows = np.flatnonzero(known_per_row * 2 >= self.n_days)
+        names = self.cells.to_numpy()[self.offsets[driver_rows]].tolist()
+
+        # a second row with the same name would overwrite the first, so
+        # later ones are numbered: 'SMITH, J', 'SMITH, J (2)', ...
+        drivers = {}
+        for name, row in zip(names, driver_rows.tolist()):
+            unique, k = name, 1
+            while unique in drivers:
+                k += 1
+                unique = f'{name} ({k})'
+            if unique != name:
+                print(f"Warning: duplicate driver name '{name}' in sheet row {row}, "
+                      f"listed as '{unique}'", file=sys.stderr)
+            drivers[unique] = row
+        return drivers
+
+    def row(self, row_index: int) -> list:
+        """
+        Returns the cleaned cells of a sheet row as a list.
+        """
+        return self.cells.iloc[self.offsets[row_index]:self.offsets[row_index + 1]].tolist()
+
+    def row_is_off(self, row_index: int) -> list:
+        """
+        Returns the day-off flags of a sheet row as a list.
+        """
+        return self.is_off[self.offsets[row_index]:self.offsets[row_index + 1]].tolist()
+
+    def find_rows(self, search_term: str) -> list[int]:
+        """
+        Finds the sheet rows containing a search term, checking the driver
+        names first and falling back to every cell.
+
+        Args:
+            search_term: The string to look for, e.g. a driver's surname.
+
+        Returns:
+            A sorted list of sheet row indices, empty if nothing matched.
+        """
+        if search_term in self.drivers:
+            return [self.drivers[search_term]]
+
+        rows = [row for name, row in self.drivers.items() if search_term in name]
+        if rows:
+            return sorted(rows)
+
+        found = self.cells.str.contains(search_term, regex=False).to_numpy(dtype=bool)
+        return np.unique(self.rows[found]).tolist()
+
+
+def snapshot_path(file_path):
+    """
+    Returns the snapshot directory for a workbook: '.roster_cache/<sha256>-v<version>'
+    next to the workbook, so an edited workbook never hits a stale snapshot.
+    """
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), SNAPSHOT_DIR)
+    return os.path.join(cache_dir, f'{ru.file_digest(file_path)}-v{SNAPSHOT_VERSION}')
+
+
+def save_snapshot(sheet, path):
+    """
+    Saves the cleaned sheet as a directory of .npy arrays: the categorical
+    cell codes (int32), their categories (fixed-width unicode) and the row
+    layout. A failed save is only a warning; the next run just rebuilds it.
+    """
+    arrays = {'codes': sheet.cells.cat.codes.to_numpy().astype(np.int32),
+              'categories': np.array(sheet.cells.cat.categories.tolist(), dtype=str),
+              'rows': np.asarray(sheet.rows, dtype=np.int32),
+              'pos': np.asarray(sheet.pos, dtype=np.int32),
+              'offsets': np.asarray(sheet.offsets, dtype=np.int64)}
+
+    # write everything to a scratch directory and move it into place, so a
+    # reader never sees half a snapshot
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    try:
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, name + '.npy'), array, allow_pickle=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        # another run saving the same workbook got there first
+        if not os.path.isdir(path):
+            print(f"Warning: could not save the roster snapshot '{path}': {e}")
+
+
+def load_snapshot(path, daysoff, n, n_days):
+    """
+    Loads a snapshot saved by save_snapshot, memory-mapping its arrays.
+
+    Returns:
+        RosterSheet or None: The sheet, or None if there is no usable snapshot.
+    """
+    if not os.path.isdir(path):
+        return None
+    try:
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode='r', allow_pickle=False)
+                  for name in SNAPSHOT_ARRAYS}
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring unreadable roster snapshot '{path}': {e}")
+        return None
+
+    return RosterSheet.from_arrays(arrays['codes'], arrays['categories'].tolist(), arrays['rows'],
+                                   arrays['pos'], arrays['offsets'], daysoff, n, n_days)
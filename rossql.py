@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite backend for the duty databases and resolved rosters.
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import rosdb as rdb
+import rosdate as rd
+import rosroutes as rr
+
+# bump when a table changes; connect() migrates older files
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS timetables (
+    timetable_id INTEGER PRIMARY KEY,
+    fingerprint  TEXT    NOT NULL UNIQUE,
+    loaded_at    REAL    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS duties (
+    timetable_id INTEGER NOT NULL REFERENCES timetables (timetable_id),
+    day_type     INTEGER NOT NULL,
+    duty_code    TEXT    NOT NULL,
+    sign_on      INTEGER NOT NULL,
+    sign_off     INTEGER NOT NULL,
+    routes       INTEGER NOT NULL,
+    school_runs  TEXT    NOT NULL,
+    PRIMARY KEY (timetable_id, day_type, duty_code)
+);
+CREATE TABLE IF NOT EXISTS duty_routes (
+    timetable_id INTEGER NOT NULL REFERENCES timetables (timetable_id),
+    day_type     INTEGER NOT NULL,
+    duty_code    TEXT    NOT NULL,
+    route        TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS duty_routes_route ON duty_routes (route, timetable_id, day_type);
+CREATE INDEX IF NOT EXISTS duty_routes_duty ON duty_routes (timetable_id, day_type, duty_code);
+CREATE TABLE IF NOT EXISTS periods (
+    period_id    INTEGER PRIMARY KEY,
+    roster_file  TEXT    NOT NULL,
+    roster_start TEXT    NOT NULL,
+    loaded_at    REAL    NOT NULL,
+    timetable_id INTEGER REFERENCES timetables (timetable_id),
+    UNIQUE (roster_file, roster_start)
+);
+CREATE TABLE IF NOT EXISTS rosters (
+    period_id   INTEGER NOT NULL REFERENCES periods (period_id),
+    driver      TEXT    NOT NULL,
+    date        TEXT    NOT NULL,
+    day_type    INTEGER NOT NULL,
+    shift       TEXT    NOT NULL COLLATE NOCASE,
+    duty_code   TEXT,
+    PRIMARY KEY (period_id, driver, date)
+);
+CREATE INDEX IF NOT EXISTS rosters_date_shift ON rosters (date, shift);
+CREATE INDEX IF NOT EXISTS rosters_driver ON rosters (driver, date);
+"""
+
+
+def connect(db_path):
+    """
+    Opens (and if need be creates) a roster database.
+
+    The journal runs in WAL mode so any number of readers on the machine can
+    query the file while a run is writing to it.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+        migrate(conn)
+    conn.executescript(SCHEMA)
+    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    return conn
+
+
+def migrate(conn):
+    """
+    Brings a database written before timetables to the current schema.
+
+    The duty tables only ever held the last timetable loaded, so they are
+    dropped and stored again, keyed by timetable, on the next run. Stored
+    periods are kept; as nobody knows which timetable they were resolved
+    against, their timetable_id stays NULL and route lookups skip them.
+    """
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS duty_routes')
+        conn.execute('DROP TABLE IF EXISTS duties')
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(periods)')]
+        if columns and 'timetable_id' not in columns:
+            conn.execute('ALTER TABLE periods ADD COLUMN timetable_id INTEGER REFERENCES timetables (timetable_id)')
+
+
+def iso_date(date_str):
+    """
+    Converts a 'dd-mm-yyyy' roster date to 'yyyy-mm-dd', which sorts and
+    compares correctly as text. A date already in 'yyyy-mm-dd', as history
+    prints them, is accepted too.
+
+    Raises:
+        ValueError: If date_str is in neither format.
+    """
+    for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(date_str.strip(), fmt).date().isoformat()
+        except ValueError:
+            pass
+    raise ValueError(f"invalid date '{date_str}', expected dd-mm-yyyy or yyyy-mm-dd")
+
+
+def record_from_row(row, extra_routes=()):
+    """
+    Builds a DutyRecord from a (duty_code, sign_on, sign_off, routes,
+    school_runs) row of the duties table and the duty's routes that are not
+    in the route catalogue.
+    """
+    code, sign_on, sign_off, routes, school_runs = row
+    runs = [int(run) for run in school_runs.split()]
+    return rdb.DutyRecord(code, sign_on, sign_off, routes, runs, extra_routes)
+
+
+class RosterStore:
+    """
+    SQLite backend for the duty databases and the resolved rosters.
+
+    Duties are stored per timetable (one set of duty databases, identified
+    by their contents) and day-type (the index of their db file in
+    db_files), with the routes they work in a side table indexed by route.
+    Resolved rosters are stored per roster period, one row per driver per
+    day, and each period records the timetable it was resolved against, so
+    an older period still joins to the duties it was rostered on. Reverse
+    lookups and a driver's history across periods are indexed queries.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = connect(db_path)
+
+    def close(self):
+        self.conn.close()
+
+    def load_duties(self, duty_db, db_files):
+        """
+        Stores the duties of the loaded duty databases as a timetable. A
+        timetable already stored, i.e. the same duties on the same
+        day-types, is reused rather than stored again; the duties of earlier
+        timetables are kept for the periods rostered on them.
+
+        Args:
+            duty_db: The loaded DutyDatabase.
+            db_files (list[str]): The db file of each day-type, in day-type order.
+
+        Returns:
+            tuple: (timetable_id, number of duties in the timetable).
+        """
+        records = []
+        fingerprint = hashlib.sha256()
+        for day_type, file_path in enumerate(db_files):
+            index = duty_db.indexes.get(file_path)
+            if index is None:
+                continue
+            for record in index.values():
+                records.append((day_type, record))
+                fingerprint.update(f'{day_type} {record}\n'.encode('utf-8'))
+
+        with self.conn:
+            cur = self.conn.execute('INSERT INTO timetables (fingerprint, loaded_at) VALUES (?, ?) '
+                                    'ON CONFLICT (fingerprint) DO NOTHING',
+                                    (fingerprint.hexdigest(), time.time()))
+            if cur.rowcount:
+                timetable_id = cur.lastrowid
+                duties, routes = [], []
+                for day_type, record in records:
+                    duties.append((timetable_id, day_type, record.code, record.sign_on, record.sign_off,
+                                   record.routes, ' '.join(str(run) for run in record.school_runs)))
+                    routes.extend((timetable_id, day_type, record.code, route) for route in record.route_names())
+                self.conn.executemany('INSERT INTO duties VALUES (?, ?, ?, ?, ?, ?, ?)', duties)
+                self.conn.executemany('INSERT INTO duty_routes VALUES (?, ?, ?, ?)', routes)
+            else:
+                timetable_id = self.conn.execute('SELECT timetable_id FROM timetables WHERE fingerprint = ?',
+                                                 (fingerprint.hexdigest(),)).fetchone()[0]
+                self.conn.execute('UPDATE timetables SET loaded_at = ? WHERE timetable_id = ?',
+                                  (time.time(), timetable_id))
+        return timetable_id, len(records)
+
+    def latest_timetable(self):
+        """
+        Returns the id of the timetable loaded most recently, or None.
+        """
+        row = self.conn.execute('SELECT timetable_id FROM timetables ORDER BY loaded_at DESC LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def save_rosters(self, roster_file, calendar, rosters, timetable_id):
+        """
+        Stores the resolved rosters of a period, replacing any earlier run
+        of the same roster file and start date.
+
+        Args:
+            roster_file (str): The roster workbook.
+            calendar: Its RosterCalendar.
+            rosters: Iterable of (driver_name, duty) tuples.
+            timetable_id (int): The timetable the rosters were resolved
+                                against, as returned by load_duties.
+
+        Returns:
+            int: The period id.
+        """
+        name = os.path.basename(roster_file)
+        start = calendar.start_date.isoformat()
+        days = [(day.date.isoformat(), day.day_type) for day in calendar]
+
+        with self.conn:
+            self.conn.execute('INSERT INTO periods (roster_file, roster_start, loaded_at, timetable_id) '
+                              'VALUES (?, ?, ?, ?) ON CONFLICT (roster_file, roster_start) DO UPDATE SET '
+                              'loaded_at = excluded.loaded_at, timetable_id = excluded.timetable_id',
+                              (name, start, time.time(), timetable_id))
+            period_id = self.conn.execute('SELECT period_id FROM periods WHERE roster_file = ? AND roster_start = ?',
+                                          (name, start)).fetchone()[0]
+            rows = []
+            for driver_name, duty in rosters:
+                for (date_iso, day_type), value in zip(days, duty):
+                    if isinstance(value, rdb.DutyRecord):
+                        rows.append((period_id, driver_name, date_iso, day_type, value.code, value.code))
+                    elif value is not None and value != '':
+                        code = str(value)
+                        m = rdb.not_found_regex.match(code)
+                        rows.append((period_id, driver_name, date_iso, day_type, m.group(1) if m else code, None))
+
+            self.conn.execute('DELETE FROM rosters WHERE period_id = ?', (period_id,))
+            self.conn.executemany('INSERT INTO rosters VALUES (?, ?, ?, ?, ?, ?)', rows)
+        return period_id
+
+    def find_duty(self, day_type, duty_code, timetable_id=None):
+        """
+        Returns the DutyRecord of a duty on a day-type, or None. The duty is
+        looked up in timetable_id, by default the latest timetable loaded.
+        """
+        if timetable_id is None:
+            timetable_id = self.latest_timetable()
+        key = (timetable_id, day_type, duty_code.upper())
+        row = self.conn.execute('SELECT duty_code, sign_on, sign_off, routes, school_runs FROM duties '
+                                'WHERE timetable_id = ? AND day_type = ? AND duty_code = ?', key).fetchone()
+        if row is None:
+            return None
+        # the routes bitmask only covers the catalogue, the rest are in duty_routes
+        routes = self.conn.execute('SELECT route FROM duty_routes WHERE timetable_id = ? AND day_type = ? '
+                                   'AND duty_code = ? ORDER BY rowid', key)
+        return record_from_row(row, [route for route, in routes if route not in rr.routes])
+
+    def duties_on_route(self, day_type, route, timetable_id=None):
+        """
+        Returns the codes of the duties working a route on a day-type, in
+        timetable_id or by default the latest timetable loaded.
+        """
+        if timetable_id is None:
+            timetable_id = self.latest_timetable()
+        rows = self.conn.execute('SELECT duty_code FROM duty_routes WHERE route = ? AND timetable_id = ? '
+                                 'AND day_type = ? ORDER BY duty_code', (route.upper(), timetable_id, day_type))
+        return [row[0] for row in rows]
+
+    def who(self, shift, date_str):
+        """
+        Returns the drivers rostered on a duty or day-off code on a
+        'dd-mm-yyyy' date, from the latest stored period holding that date.
+        """
+        date_iso = iso_date(date_str)
+        rows = self.conn.execute('SELECT driver FROM rosters WHERE date = ? AND shift = ? '
+                                 'AND period_id = (SELECT max(period_id) FROM rosters WHERE date = ?) ORDER BY driver',
+                                 (date_iso, shift, date_iso))
+        return [row[0] for row in rows]
+
+    def who_on_route(self, route, date_str):
+        """
+        Returns (driver, duty code) of everyone working a route on a date,
+        going by the timetable the roster was resolved against.
+        """
+        date_iso = iso_date(date_str)
+        rows = self.conn.execute('SELECT r.driver, r.duty_code FROM rosters r '
+                                 'JOIN periods p ON p.period_id = r.period_id JOIN duty_routes d '
+                                 'ON d.timetable_id = p.timetable_id AND d.day_type = r.day_type '
+                                 'AND d.duty_code = r.duty_code WHERE r.date = ? AND d.route = ? '
+                                 'AND r.period_id = (SELECT max(period_id) FROM rosters WHERE date = ?) ORDER BY r.driver',
+                                 (date_iso, route.upper(), date_iso))
+        return rows.fetchall()
+
+    def history(self, driver):
+        """
+        Returns every stored day of drivers matching driver, across periods,
+        as (driver, date, shift) in date order.
+        """
+        rows = self.conn.execute('SELECT driver, date, shift FROM rosters r WHERE driver LIKE ? '
+                                 'AND period_id = (SELECT max(period_id) FROM rosters '
+                                 'WHERE driver = r.driver AND date = r.date) ORDER BY driver, date',
+                                 (f'%{driver}%',))
+        return rows.fetchall()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='query a roster database written by main.py --sqlite',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('db', metavar='DB', help='SQLite roster database')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('duty', help='show a duty')
+    p.add_argument('code')
+    p.add_argument('-t', '--day-type', type=int, default=rd.MON_THU, help='0 Mon-Thu, 1 Fri, 2 Sat, 3 Sun, 4 Mon-Fri vacation')
+    p = sub.add_parser('who', help='drivers on a duty or day-off code')
+    p.add_argument('code')
+    p.add_argument('date', help='dd-mm-yyyy or yyyy-mm-dd')
+    p = sub.add_parser('route', help='drivers working a route')
+    p.add_argument('route')
+    p.add_argument('date', help='dd-mm-yyyy or yyyy-mm-dd')
+    p = sub.add_parser('history', help="a driver's roster across periods")
+    p.add_argument('driver')
+
+    args = parser.parse_args()
+    if args.command in ('who', 'route'):
+        try:
+            iso_date(args.date)
+        except ValueError as e:
+            parser.error(str(e))
+    if not os.path.exists(args.db):
+        print(f"Error: File not found at '{args.db}'")
+        sys.exit(1)
+
+    store = RosterStore(args.db)
+    if args.command == 'duty':
+        record = store.find_duty(args.day_type, args.code)
+        print(record if record else f"*** {args.code} Shift not found ***")
+    elif args.command == 'who':
+        for driver in store.who(args.code, args.date):
+            print(driver)
+    elif args.command == 'route':
+        for driver, code in store.who_on_route(args.route, args.date):
+            print(f'{driver:<30} {code}')
+    elif args.command == 'history':
+        for driver, date_iso, shift in store.history(args.driver):
+            print(f'{driver:<30} {date_iso} {shift}')
+    store.close()
+    sys.exit(0)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized summaries of a resolved roster.
+"""
+
+import numpy as np
+
+import rosdb as rdb
+import rosroutes as rr
+
+# kinds of roster cell
+DUTY, DAY_OFF, UNRESOLVED, EMPTY = range(4)
+
+
+class RosterMatrix:
+    """
+    The resolved rosters of a depot as driver x day NumPy arrays.
+
+    Every distinct cell value (a DutyRecord, a day-off code or an unresolved
+    marker) is decoded once into per-value arrays; the matrices are then
+    filled by indexing those arrays with a driver x day matrix of value ids,
+    so the summaries below never loop over drivers or days in Python.
+
+    Attributes:
+        drivers (list[str]): Driver names, one per matrix row.
+        kind (np.ndarray): DUTY, DAY_OFF, UNRESOLVED or EMPTY per cell.
+        sign_on, sign_off (np.ndarray): Minutes since midnight, -1 off duty.
+        spread (np.ndarray): Sign on to sign off in minutes, 0 off duty.
+        routes (np.ndarray or None): driver x day x route booleans, True
+            where the cell's duty works rosroutes.routes[i]; None if the
+            matrix was built without routes.
+        off_code (np.ndarray): Index into daysoff, -1 unless a day off.
+        run_driver, run_day, run_code (np.ndarray): One entry per school run
+            worked; run_code indexes school_runs.
+        school_runs (np.ndarray): The distinct school run numbers.
+    """
+
+    def __init__(self, rosters, n_days, daysoff, routes=True):
+        """
+        Args:
+            rosters: Iterable of (driver_name, duty list) as produced by
+                     main.iter_driver_rosters.
+            n_days (int): Days in the roster period.
+            daysoff (list[str]): The day-off codes.
+            routes (bool): Build the routes matrix; scans that never look
+                           at routes can skip it.
+        """
+        self.daysoff = list(daysoff)
+        self.n_days = n_days
+        off_index = {code: i for i, code in enumerate(self.daysoff)}
+
+        # value id 0 is reserved for a missing cell
+        values = {}
+        u_kind, u_on, u_off, u_routes, u_off_code = [EMPTY], [-1], [-1], [0], [-1]
+        u_runs = [()]
+
+        self.drivers = []
+        ids = []
+        for driver_name, duty in rosters:
+            self.drivers.append(driver_name)
+            row = [0] * n_days
+            for day, value in enumerate(duty[:n_days]):
+                if value == '':
+                    # a blank roster cell stays EMPTY, like a missing day
+                    continue
+                key = value
+                vid = values.get(key)
+                if vid is None:
+                    vid = len(u_kind)
+                    values[key] = vid
+                    if isinstance(value, rdb.DutyRecord):
+                        u_kind.append(DUTY)
+                        u_on.append(value.sign_on)
+                        u_off.append(value.sign_off)
+                        u_routes.append(value.routes)
+                        u_off_code.append(-1)
+                        u_runs.append(tuple(value.school_runs))
+                    else:
+                        is_off = key in off_index
+                        u_kind.append(DAY_OFF if is_off else UNRESOLVED)
+                        u_on.append(-1)
+                        u_off.append(-1)
+                        u_routes.append(0)
+                        u_off_code.append(off_index[key] if is_off else -1)
+                        u_runs.append(())
+                row[day] = vid
+            ids.append(row)
+
+        ids = np.array(ids, dtype=np.int64).reshape(len(self.drivers), n_days)
+        u_on = np.array(u_on, dtype=np.int16)
+        u_off = np.array(u_off, dtype=np.int16)
+
+        self.kind = np.array(u_kind, dtype=np.int8)[ids]
+        self.sign_on = u_on[ids]
+        self.sign_off = u_off[ids]
+        u_spread = np.where(u_on >= 0, (u_off.astype(np.int32) - u_on) % (24 * 60), 0)
+        self.spread = u_spread[ids]
+        self.routes = None
+        if routes:
+            # one boolean per catalogue route, so the catalogue can hold any
+            # number of routes; the masks are Python ints of any width
+            bits = [[mask >> i & 1 for i in range(len(rr.routes))] for mask in u_routes]
+            self.routes = np.array(bits, dtype=bool).reshape(len(u_routes), len(rr.routes))[ids]
+        self.off_code = np.array(u_off_code, dtype=np.int16)[ids]
+
+        # school runs are ragged, so lay them out flat: one entry per run worked
+        n_runs = np.array([len(r) for r in u_runs], dtype=np.int64)
+        flat_runs = np.array([run for r in u_runs for run in r], dtype=np.int64)
+        run_start = np.concatenate(([0], np.cumsum(n_runs)[:-1]))
+
+        cell_runs = n_runs[ids].ravel()
+        total = int(cell_runs.sum())
+        cell = np.repeat(np.arange(ids.size), cell_runs)
+        first = np.repeat(np.cumsum(cell_runs) - cell_runs, cell_runs)
+        within = np.arange(total) - first
+        runs = flat_runs[run_start[ids.ravel()[cell]] + within] if total else np.zeros(0, dtype=np.int64)
+
+        self.school_runs, self.run_code = np.unique(runs, return_inverse=True)
+        self.run_driver, self.run_day = np.divmod(cell, n_days) if n_days else (cell, cell)
+
+    def route_counts(self):
+        """
+        Returns a drivers x routes matrix of how many days each driver works
+        each route.
+        """
+        return self.routes.sum(axis=1, dtype=np.int64)
+
+    def school_run_counts(self):
+        """
+        Returns a drivers x school_runs matrix of how many times each driver
+        works each school run.
+        """
+        counts = np.zeros((len(self.drivers), len(self.school_runs)), dtype=np.int64)
+        np.add.at(counts, (self.run_driver, self.run_code), 1)
+        return counts
+
+    def days_off_counts(self):
+        """
+        Returns a drivers x daysoff matrix of days off by category.
+        """
+        n = len(self.drivers)
+        k = len(self.daysoff)
+        driver = np.broadcast_to(np.arange(n)[:, None], self.off_code.shape)
+        is_off = self.off_code >= 0
+        flat = driver[is_off] * k + self.off_code[is_off]
+        return np.bincount(flat, minlength=n * k).reshape(n, k)
+
+
+def summarise(matrix):
+    """
+    Works out per-driver and depot-wide totals for a roster period.
+
+    Returns:
+        dict: {'drivers': [per-driver totals], 'depot': depot totals}. Hours
+              are sign on to sign off; spreads are per duty, in hours.
+    """
+    on_duty = matrix.kind == DUTY
+    duties = on_duty.sum(axis=1)
+    minutes = matrix.spread.sum(axis=1, dtype=np.int64)
+    max_spread = matrix.spread.max(axis=1, initial=0)
+    mean_spread = np.divide(minutes, duties, out=np.zeros(len(duties)), where=duties > 0)
+    unresolved = (matrix.kind == UNRESOLVED).sum(axis=1)
+    days_off = matrix.days_off_counts()
+    routes = matrix.route_counts()
+    school_runs = matrix.school_run_counts()
+    run_names = [f"{run:03d}n" for run in matrix.school_runs]
+
+    def counts(names, row):
+        return {name: int(c) for name, c in zip(names, row) if c}
+
+    drivers = []
+    for i, driver_name in enumerate(matrix.drivers):
+        drivers.append({'driver': driver_name,
+                        'duties': int(duties[i]),
+                        'hours': round(minutes[i] / 60, 2),
+                        'max_spread': round(max_spread[i] / 60, 2),
+                        'mean_spread': round(mean_spread[i] / 60, 2),
+                        'unresolved': int(unresolved[i]),
+                        'days_off': counts(matrix.daysoff, days_off[i]),
+                        'routes': counts(rr.routes, routes[i]),
+                        'school_runs': counts(run_names, school_runs[i])})
+
+    total_duties = int(duties.sum())
+    depot = {'drivers': len(matrix.drivers),
+             'duties': total_duties,
+             'hours': round(int(minutes.sum()) / 60, 2),
+             'max_spread': round(int(max_spread.max(initial=0)) / 60, 2),
+             'mean_spread': round(int(minutes.sum()) / total_duties / 60, 2) if total_duties else 0.0,
+             'unresolved': int(unresolved.sum()),
+             'days_off': counts(matrix.daysoff, days_off.sum(axis=0)),
+             'routes': counts(rr.routes, routes.sum(axis=0)),
+             'school_runs': counts(run_names, school_runs.sum(axis=0))}
+
+    return {'drivers': drivers, 'depot': depot}
+
+
+def print_summary(summary, roster_start, file=None):
+    """
+    Prints a summary from summarise as a text table.
+    """
+    header = f"| {'Driver':<24} | {'Duties':>6} | {'Hours':>7} | {'Max spread':>10} | {'Days off':>8} | {'Unresolved':>10} |"
+    dash = '-' * len(header)
+    print(dash, file=file)
+    print(f"| Roster start date: {roster_start}".ljust(len(header) - 1) + '|', file=file)
+    print(dash, file=file)
+    print(header, file=file)
+    print(dash, file=file)
+    for d in summary['drivers'] + [dict(summary['depot'], driver='DEPOT')]:
+        print(f"| {d['driver']:<24} | {d['duties']:>6} | {d['hours']:>7.2f} | {d['max_spread']:>10.2f} "
+              f"| {sum(d['days_off'].values()):>8} | {d['unresolved']:>10} |", file=file)
+    print(dash, file=file)
+
+    depot = summary['depot']
+    for title, counts in (('Days off', depot['days_off']), ('Routes', depot['routes']), ('School runs', depot['school_runs'])):
+        print(f"{title}: " + ', '.join(f"{name} {count}" for name, count in counts.items()), file=file)
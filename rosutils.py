@@ -5,6 +5,7 @@ Created on Wed Jun 25 13:18:26 2025
 @author: david
 """
 
+import hashlib
 import os
 
 def remove_newlines(text_string):
@@ -61,4 +62,14 @@ def find_row_with_string(file_path, search_string):
 
     except Exception as e:
         print(f"An error occurred while reading the file: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def file_digest(file_path):
+    """
+    Returns the SHA-256 hex digest of a file's contents, read in 1 MiB chunks.
+    """
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming reader for .xlsx roster workbooks.
+"""
+
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+duty_code_regex = r'^[A-Za-z]{1,2}\d{2,4}$'
+duty_code_pattern = re.compile(duty_code_regex)
+
+# SpreadsheetML tags, as ElementTree names them
+S_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+S_ROW, S_C, S_V, S_T, S_IS, S_SI, S_R, S_SHEET = (S_NS + tag for tag in ('row', 'c', 'v', 't', 'is', 'si', 'r', 'sheet'))
+R_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+REL = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+
+
+def first_sheet_path(xlsx):
+    """
+    Returns the zip member holding the first worksheet of a workbook, the
+    one pd.read_excel reads by default.
+    """
+    try:
+        with xlsx.open('xl/workbook.xml') as f:
+            sheet = next(ET.parse(f).iter(S_SHEET))
+        with xlsx.open('xl/_rels/workbook.xml.rels') as f:
+            targets = {rel.get('Id'): rel.get('Target') for rel in ET.parse(f).iter(REL)}
+        target = targets[sheet.get(R_ID)]
+    except (KeyError, StopIteration):
+        return 'xl/worksheets/sheet1.xml'
+
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join('xl', target))
+
+
+def string_text(elem):
+    """
+    Returns the text of an <si> or <is> string: plain <t>, or rich text split
+    over <r> runs. Phonetic hints (<rPh>) are not part of the text.
+    """
+    parts = []
+    for child in elem:
+        if child.tag == S_T:
+            parts.append(child.text or '')
+        elif child.tag == S_R:
+            parts.extend(t.text or '' for t in child.iter(S_T))
+    return ''.join(parts)
+
+
+def read_shared_strings(xlsx):
+    """
+    Reads the workbook's shared string table, or [] if it has none.
+    """
+    try:
+        f = xlsx.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+
+    strings = []
+    with f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == S_SI:
+                strings.append(string_text(elem))
+                elem.clear()
+    return strings
+
+
+def cell_value(cell, shared_strings):
+    """
+    Converts a worksheet <c> element to a Python value, None if it is empty.
+    """
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        inline = cell.find(S_IS)
+        return None if inline is None else string_text(inline)
+
+    v = cell.find(S_V)
+    if v is None or v.text is None:
+        return None
+    if kind == 's':
+        return shared_strings[int(v.text)]
+    if kind in ('str', 'e'):
+        return v.text
+    if kind == 'b':
+        return v.text == '1'
+    try:
+        return int(v.text)
+    except ValueError:
+        return float(v.text)
+
+
+def column_index(ref):
+    """
+    Returns the 0-based column of a cell reference such as 'C5', or None if
+    it has no column letters.
+    """
+    col = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        col = col * 26 + ord(ch.upper()) - ord('A') + 1
+    return col - 1 if col else None
+
+
+def iter_sheet_rows(file_path):
+    """
+    Streams the first worksheet of an .xlsx file row by row.
+
+    The worksheet XML is parsed incrementally straight out of the zip and
+    every row is cleared once read, so only the current row is in memory.
+    Cells are placed by the column in their 'r' reference, so a cell left
+    out of the XML shows up as None in its column.
+
+    Yields:
+        list: The cell values of each row from column A to its last stored
+              cell, None for an empty cell.
+    """
+    with zipfile.ZipFile(file_path) as xlsx:
+        shared_strings = read_shared_strings(xlsx)
+        with xlsx.open(first_sheet_path(xlsx)) as f:
+            for _, elem in ET.iterparse(f):
+                if elem.tag != S_ROW:
+                    continue
+                values = []
+                for cell in elem.iter(S_C):
+                    col = column_index(cell.get('r', ''))
+                    if col is not None and col > len(values):
+                        values.extend([None] * (col - len(values)))
+                    values.append(cell_value(cell, shared_strings))
+                yield values
+                elem.clear()
+
+
+def clean_cells(values):
+    """
+    Cleans one sheet row the way RosterSheet cleans the whole sheet: drops
+    the empty cells before the first and after the last value, keeps the
+    ones in between as '' so every day stays in its column, cuts duty codes
+    such as 'H860B1' back to 4 characters (but not the name in position 0)
+    and removes newlines.
+    """
+    filled = [i for i, value in enumerate(values) if value is not None]
+    if not filled:
+        return []
+
+    cells = []
+    for value in values[filled[0]:filled[-1] + 1]:
+        s = '' if value is None else str(value)
+        if cells and s[:1] in ('D', 'H'):
+            s = s[:4]
+        cells.append(s.replace('\n', ''))
+    return cells
+
+
+def is_driver_row(cells, daysoff, n, n_days):
+    """
+    True for a driver row: a name followed by day cells, most of which are
+    duty or day-off codes. Same test as RosterSheet._index_drivers.
+    """
+    known = sum(1 for cell in cells[n:n + n_days] if cell in daysoff or duty_code_pattern.match(cell))
+    return known * 2 >= n_days
+
+
+def find_driver_row(file_path, search_term, daysoff, n, n_days):
+    """
+    Streams a roster workbook for the driver row matching search_term the
+    way RosterSheet.find_rows does: a driver named exactly search_term wins,
+    otherwise the first driver row whose name contains it. Reading stops
+    early only at an exact match, since a later row may still be one.
+
+    Args:
+        file_path (str): The roster workbook (.xlsx).
+        search_term (str): The string to look for, e.g. a driver's surname.
+        daysoff (list[str]): The day-off codes.
+        n (int): Number of leading cells (name, line, ...) before the first day.
+        n_days (int): Number of days in the roster period.
+
+    Returns:
+        list[str] or None: The cleaned cells of the row, or None if no
+                           driver name matched.
+    """
+    rows = iter_sheet_rows(file_path)
+    # the first row is the header pd.read_excel takes the column names from
+    next(rows, None)
+    first = None
+    for values in rows:
+        cells = clean_cells(values)
+        if cells and search_term in cells[0] and is_driver_row(cells, daysoff, n, n_days):
+            if cells[0] == search_term:
+                rows.close()
+                return cells
+            if first is None:
+                first = cells
+    return first